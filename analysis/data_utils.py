@@ -1,17 +1,24 @@
 """Shared data loading, genotype mapping, and analysis utilities.
 
 Used by all H1–H10 hypothesis notebooks.
+
+Plotting, SciPy and Groups.xlsx-derived names (plt, sns, cKDTree, kruskal,
+mannwhitneyu, spearmanr, GENOTYPE_MAP) are loaded on first access, so
+``import data_utils`` only costs numpy + pandas. ``from data_utils import *``
+still provides all of them.
 """
 
+import functools
+import importlib
+import itertools
+import json
+import math
+import os
 import re
 from pathlib import Path
 
-import matplotlib.pyplot as plt
 import numpy as np
 import pandas as pd
-import seaborn as sns
-from scipy.spatial import cKDTree
-from scipy.stats import kruskal, mannwhitneyu, spearmanr
 
 # ---------------------------------------------------------------------------
 # Paths & constants
@@ -21,11 +28,14 @@ DATA_CSV = PROJECT / "Measurements" / "AnnotationsFinal.csv"
 GROUPS_XLSX = PROJECT / "Groups.xlsx"
 FIGURES_DIR = PROJECT / "analysis" / "figures"
 TABLES_DIR = PROJECT / "analysis" / "tables"
-FIGURES_DIR.mkdir(exist_ok=True)
-TABLES_DIR.mkdir(exist_ok=True)
 
 GENO_ORDER = ["C/C", "C/T", "T/T"]
-GENO_PALETTE = dict(zip(GENO_ORDER, sns.color_palette("Set2", 3)))
+# seaborn color_palette("Set2", 3)
+GENO_PALETTE = dict(zip(GENO_ORDER, [
+    (0.4, 0.7607843137254902, 0.6470588235294118),
+    (0.9882352941176471, 0.5529411764705883, 0.3843137254901961),
+    (0.5529411764705883, 0.6274509803921569, 0.796078431372549),
+]))
 MAIN_REGIONS = ["Follicle", "PALS", "RedPulp", "Trabeculae"]
 EXCLUDE_SAMPLES = {"HDL018", "HDL021", "HDL172"}
 
@@ -33,6 +43,17 @@ CODEX_SAMPLES = {"1901HBMP004", "HDL073", "HBMP006", "HBMP007", "HDL098"}
 PHENOCYCLER_SAMPLES = {"HDL011", "HDL043", "HDL052", "HDL053", "HDL055",
                        "HDL063", "HDL070", "HDL079", "HDL086", "HDL094"}
 CODEX_CSV = PROJECT / "Measurements" / "ForSH2B3.csv"
+CELLS_CSV = PROJECT / "Measurements" / "Cells.csv"
+# Follicle/PALS polygons from scripts/export_regions_geojson.groovy (pixel coordinates)
+GEOJSON_DIR = PROJECT / "analysis" / "geojson"
+PIXEL_SIZE_UM = {"Phenocycler": 0.5077663810243286, "CODEX": 0.37740007578193524}
+
+# Harmonized Parquet cache of both annotation CSVs (see load_annotations)
+CACHE_DIR = PROJECT / "analysis" / "cache"
+_ANNOTATION_CACHE_VERSION = 2
+_ANNOTATION_CATEGORIES = ["Image", "Classification", "Region", "Sample", "Genotype", "Platform"]
+_GROUPS_CACHE_VERSION = 1
+_POLYGON_CACHE_VERSION = 1
 
 # CODEX region/class harmonization
 _CODEX_REGION_MAP = {"Red_Pulp": "RedPulp", "Sinusoid": "RedPulp",
@@ -56,6 +77,32 @@ _ALT_TO_HANDEL = {
 }
 
 
+# Loaded on first access through the module __getattr__ below
+_LAZY_IMPORTS = {
+    "plt": ("matplotlib.pyplot", None),
+    "sns": ("seaborn", None),
+    "cKDTree": ("scipy.spatial", "cKDTree"),
+    "kruskal": ("scipy.stats", "kruskal"),
+    "mannwhitneyu": ("scipy.stats", "mannwhitneyu"),
+    "spearmanr": ("scipy.stats", "spearmanr"),
+}
+
+
+def __getattr__(name):
+    """Resolve lazy module attributes (_LAZY_IMPORTS and GENOTYPE_MAP) once."""
+    if name in _LAZY_IMPORTS:
+        module, attr = _LAZY_IMPORTS[name]
+        value = importlib.import_module(module)
+        if attr is not None:
+            value = getattr(value, attr)
+    elif name == "GENOTYPE_MAP":
+        value = genotype_map()
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
+
+
 # ---------------------------------------------------------------------------
 # Sample ID extraction
 # ---------------------------------------------------------------------------
@@ -85,6 +132,29 @@ def extract_sample_id(image_name: str) -> str:
     return image_name
 
 
+def sample_ids(images) -> pd.Series:
+    """Vectorized extract_sample_id over a column of image names.
+
+    Each distinct image name is parsed once and the result is broadcast back
+    through categorical codes, so the cost does not grow with the number of
+    rows. Returns a categorical Series aligned with ``images`` whose
+    categories are exactly the samples present; filtering rows afterwards
+    leaves unused categories, so group such subsets with ``observed=True``.
+    """
+    images = pd.Series(images)
+    if isinstance(images.dtype, pd.CategoricalDtype):
+        images = images.cat.remove_unused_categories()
+        codes = images.cat.codes.to_numpy()
+        uniques = images.cat.categories
+    else:
+        codes, uniques = pd.factorize(images)
+    ids = np.array([extract_sample_id(u) for u in uniques], dtype=object)
+    samples, inverse = np.unique(ids, return_inverse=True)
+    sample_codes = np.where(codes >= 0, inverse[codes], -1) if len(uniques) else codes
+    return pd.Series(pd.Categorical.from_codes(sample_codes, samples),
+                     index=images.index, name="Sample")
+
+
 # ---------------------------------------------------------------------------
 # Genotype mapping
 # ---------------------------------------------------------------------------
@@ -99,62 +169,137 @@ def _normalize_genotype(g):
     return s
 
 
-def _build_genotype_map() -> dict:
-    """Build sample_id → genotype dictionary from Groups.xlsx."""
+def _alt_to_sample(alt: pd.Series) -> pd.Series:
+    """Map Groups.xlsx ALT IDs to HANDEL IDs via _ALT_TO_HANDEL.
+
+    Groups.xlsx uses 5-digit ALT IDs (e.g. 19001 → key 1901): try the ID
+    directly, then the 4-digit shorthand (first 2 + last 2 digits).
+    """
+    alt_str = alt.dropna().astype(int).astype(str)
+    short = (alt_str.str[:2] + alt_str.str[3:]).where(alt_str.str.len() == 5)
+    mapped = alt_str.map(_ALT_TO_HANDEL).fillna(short.map(_ALT_TO_HANDEL))
+    return mapped.reindex(alt.index)
+
+
+def _parse_groups_xlsx() -> pd.DataFrame:
+    """Parse Groups.xlsx into the typed per-donor table behind groups_table().
+
+    Columns: Sample (HANDEL ID, else the mapped ALT ID), HANDEL ID, ALT Sample,
+    Genotype (normalized rs3184504), CLINICAL_COLS (continuous ones numeric),
+    one normalized genotype column per SNP and one 0/1/2 dosage column per
+    ``<snp>_risk_het_prot`` annotation (Protective/Het/Risk).
+    """
     g = pd.read_excel(GROUPS_XLSX)
+    missing = pd.Series(np.nan, index=g.index)
+    handel = g.get("HANDEL ID", missing)
+    handel = handel.where(handel.isna(), handel.astype(str).str.strip())
+    alt_sample = _alt_to_sample(g.get("ALT ID", missing))
+
     geno_col = "rs3184504" if "rs3184504" in g.columns else "rs3184504 (SH2B3)"
-    geno_map = {}
-    for _, row in g.iterrows():
-        geno = row.get(geno_col)
-        if pd.isna(geno):
-            continue
-        geno = _normalize_genotype(geno)
-        # Map by HANDEL ID
-        handel = row.get("HANDEL ID")
-        if pd.notna(handel):
-            geno_map[str(handel).strip()] = geno
-        # Map by ALT ID patterns (Groups.xlsx uses 5-digit, e.g. 19001 → key 1901)
-        alt = row.get("ALT ID")
-        if pd.notna(alt):
-            alt_str = str(int(alt))
-            # Try direct lookup first, then 4-digit shorthand (first2 + last2)
-            mapped = _ALT_TO_HANDEL.get(alt_str)
-            if not mapped and len(alt_str) == 5:
-                short = alt_str[:2] + alt_str[3:]
-                mapped = _ALT_TO_HANDEL.get(short)
-            if mapped:
-                geno_map[mapped] = geno
-    return geno_map
+    snp_cols = [c for c in g.columns
+                if c.startswith("rs") and "_risk_het_prot" not in c]
+    risk_cols = [c for c in g.columns if c.endswith("_risk_het_prot")]
+
+    table = pd.DataFrame({
+        "Sample": handel.fillna(alt_sample),
+        "HANDEL ID": handel,
+        "ALT Sample": alt_sample,
+        "Genotype": g[geno_col].map(_normalize_genotype),
+    })
+    for col in CLINICAL_COLS:
+        if col in CONTINUOUS_CLINICAL:
+            table[col] = pd.to_numeric(g[col].where(g[col] != "No Data"), errors="coerce")
+        else:
+            table[col] = g[col].astype("str").where(g[col].notna())
+    for col in snp_cols:
+        table[col] = g[col].map(_normalize_genotype).astype("str").where(g[col].notna())
+    dosage_map = {"Protective": 0, "Het": 1, "Risk": 2}
+    for col in risk_cols:
+        table[col] = g[col].map(dosage_map).astype(float)
+    return table
+
+
+@functools.lru_cache(maxsize=1)
+def _groups_table(stamp: str) -> pd.DataFrame:
+    """groups_table() for one Groups.xlsx stamp, memoized per process."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    path = CACHE_DIR / "groups.parquet"
+    if path.exists():
+        meta = pq.read_schema(path).metadata or {}
+        if meta.get(b"sources") == stamp.encode():
+            return pq.read_table(path).to_pandas()
+
+    table = _parse_groups_xlsx()
+    arrow = pa.Table.from_pandas(table, preserve_index=False)
+    arrow = arrow.replace_schema_metadata({**arrow.schema.metadata, b"sources": stamp.encode()})
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    pq.write_table(arrow, tmp)
+    os.replace(tmp, path)
+    return table
+
+
+def groups_table() -> pd.DataFrame:
+    """Typed per-donor metadata parsed from Groups.xlsx (see _parse_groups_xlsx).
+
+    Groups.xlsx is parsed once and cached as analysis/cache/groups.parquet;
+    both the file and the in-process copy are invalidated when Groups.xlsx
+    changes size or mtime. The genotype map, clinical frame and SNP panel
+    are views of this table.
+    """
+    st = GROUPS_XLSX.stat()
+    stamp = json.dumps([_GROUPS_CACHE_VERSION, st.st_size, st.st_mtime_ns])
+    return _groups_table(stamp).copy()
 
 
-GENOTYPE_MAP = _build_genotype_map()
+def genotype_map() -> dict:
+    """Build sample_id → genotype dictionary from Groups.xlsx.
 
+    Each genotyped donor is keyed by its HANDEL ID and by its mapped ALT ID;
+    later rows win.
+    """
+    g = groups_table()
+    g = g[g["Genotype"].notna()]
+    keys = np.column_stack([g["HANDEL ID"].to_numpy(object),
+                            g["ALT Sample"].to_numpy(object)]).ravel()
+    genos = np.repeat(g["Genotype"].to_numpy(object), 2)
+    valid = pd.notna(keys)
+    return dict(zip(keys[valid], genos[valid]))
 
-# ---------------------------------------------------------------------------
-# Data loading
-# ---------------------------------------------------------------------------
-def load_data() -> pd.DataFrame:
-    """Load AnnotationsFinal.csv with Sample and Genotype columns.
 
-    Drops excluded samples and rows without genotype.
+def sample_metadata(images) -> pd.DataFrame:
+    """Sample, Genotype and Platform for a column of image names.
+
+    Resolved once per distinct sample (see sample_ids) and broadcast back as
+    categoricals; Genotype is ordered by GENO_ORDER and NaN where unmapped.
     """
-    df = pd.read_csv(DATA_CSV)
-    df["Sample"] = df["Image"].apply(extract_sample_id)
-    df["Genotype"] = df["Sample"].map(GENOTYPE_MAP)
-    # Drop exclusions and unmapped
-    df = df[~df["Sample"].isin(EXCLUDE_SAMPLES)]
-    df = df.dropna(subset=["Genotype"])
-    df["Genotype"] = pd.Categorical(df["Genotype"], categories=GENO_ORDER, ordered=True)
-    return df
+    sample = sample_ids(images)
+    codes = sample.cat.codes.to_numpy()
+    samples = sample.cat.categories
+    genotype = pd.Categorical(samples.map(genotype_map()), categories=GENO_ORDER, ordered=True)
+    platform = pd.Categorical(np.where(samples.isin(CODEX_SAMPLES), "CODEX", "Phenocycler"))
+    return pd.DataFrame({
+        "Sample": sample,
+        "Genotype": genotype.take(codes, allow_fill=True),
+        "Platform": platform.take(codes, allow_fill=True),
+    }, index=sample.index)
 
 
-def load_all_data() -> pd.DataFrame:
-    """Load AnnotationsFinal.csv + ForSH2B3.csv (CODEX), harmonized.
+# ---------------------------------------------------------------------------
+# Data loading
+# ---------------------------------------------------------------------------
+def _harmonize_annotations() -> pd.DataFrame:
+    """Parse AnnotationsFinal.csv (+ ForSH2B3.csv) into one harmonized frame.
 
-    Returns combined DataFrame with Sample, Genotype, Platform columns.
+    Adds Sample, Genotype, Platform and Region (parsed from Parent) and
+    stores the label columns as categoricals. Drops excluded samples and
+    rows without genotype.
     """
-    df = load_data()
+    df = pd.read_csv(DATA_CSV)
     df["Platform"] = "Phenocycler"
+    frames = [df]
 
     if CODEX_CSV.exists():
         codex = pd.read_csv(CODEX_CSV)
@@ -165,20 +310,235 @@ def load_all_data() -> pd.DataFrame:
             lambda m: f"Annotation ({_CODEX_REGION_MAP.get(m.group(1), m.group(1))})",
             regex=True,
         )
-        codex["Sample"] = codex["Image"].apply(extract_sample_id)
-        codex["Genotype"] = codex["Sample"].map(GENOTYPE_MAP)
         codex["Platform"] = "CODEX"
-        codex = codex[~codex["Sample"].isin(EXCLUDE_SAMPLES)]
-        codex = codex.dropna(subset=["Genotype"])
-        codex["Genotype"] = pd.Categorical(
-            codex["Genotype"], categories=GENO_ORDER, ordered=True)
-        df = pd.concat([df, codex], ignore_index=True)
-        df["Genotype"] = pd.Categorical(
-            df["Genotype"], categories=GENO_ORDER, ordered=True)
+        frames.append(codex)
 
+    df = pd.concat(frames, ignore_index=True)
+    meta = sample_metadata(df["Image"])
+    df["Sample"] = meta["Sample"]
+    df["Genotype"] = meta["Genotype"]
+    df["Platform"] = df.pop("Platform")
+    # Drop exclusions and unmapped
+    df = df[~df["Sample"].isin(EXCLUDE_SAMPLES)]
+    df = df.dropna(subset=["Genotype"])
+    df["Region"] = df["Parent"].str.extract(r"Annotation \((\w+)\)", expand=False)
+    # Sample and Platform arrive categorical with the excluded and unmapped
+    # samples still in their categories; keep only the ones with rows
+    for col in _ANNOTATION_CATEGORIES:
+        df[col] = df[col].astype("category").cat.remove_unused_categories()
+    df["Genotype"] = df["Genotype"].cat.set_categories(GENO_ORDER, ordered=True)
+    return df.reset_index(drop=True)
+
+
+def _annotation_sources_key() -> str:
+    """Cache key: size and mtime of every file the harmonized frame depends on."""
+    stamps = [_ANNOTATION_CACHE_VERSION]
+    for path in (DATA_CSV, CODEX_CSV, GROUPS_XLSX):
+        if path.exists():
+            st = path.stat()
+            stamps.append([path.name, st.st_size, st.st_mtime_ns])
+        else:
+            stamps.append([path.name, None])
+    return json.dumps(stamps)
+
+
+def _annotation_cache() -> Path:
+    """Path of the harmonized Parquet cache, rebuilding it if any source changed."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    path = CACHE_DIR / "annotations.parquet"
+    key = _annotation_sources_key().encode()
+    if path.exists() and (pq.read_schema(path).metadata or {}).get(b"sources") == key:
+        return path
+
+    table = pa.Table.from_pandas(_harmonize_annotations(), preserve_index=False)
+    table = table.replace_schema_metadata({**table.schema.metadata, b"sources": key})
+    CACHE_DIR.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    pq.write_table(table, tmp)
+    os.replace(tmp, path)
+    return path
+
+
+def load_annotations(columns=None, platform=None, cache=True) -> pd.DataFrame:
+    """Load harmonized Phenocycler + CODEX annotations.
+
+    The first call writes analysis/cache/annotations.parquet; later calls
+    memory-map it, rebuilding only when AnnotationsFinal.csv, ForSH2B3.csv
+    or Groups.xlsx changed.
+
+    Parameters
+    ----------
+    columns : list of columns to read (default: all)
+    platform : "Phenocycler" or "CODEX" to read one platform only
+    cache : False to parse the CSVs without touching the cache
+    """
+    if not cache:
+        df = _harmonize_annotations()
+        if platform is not None:
+            df = df[df["Platform"] == platform].reset_index(drop=True)
+            for col in df.columns.intersection(_ANNOTATION_CATEGORIES).drop("Genotype"):
+                df[col] = df[col].cat.remove_unused_categories()
+        return df if columns is None else df[list(columns)]
+
+    import pyarrow.parquet as pq
+
+    filters = [("Platform", "==", platform)] if platform is not None else None
+    table = pq.read_table(_annotation_cache(), columns=columns, filters=filters,
+                          memory_map=True)
+    df = table.to_pandas()
+    for col in df.columns.intersection(_ANNOTATION_CATEGORIES):
+        if col == "Genotype":
+            df[col] = df[col].cat.set_categories(GENO_ORDER, ordered=True)
+        else:
+            df[col] = df[col].cat.remove_unused_categories()
     return df
 
 
+def load_data(columns=None, cache=True) -> pd.DataFrame:
+    """Load AnnotationsFinal.csv with Sample and Genotype columns.
+
+    Drops excluded samples and rows without genotype. See load_annotations
+    for ``columns`` and ``cache``.
+    """
+    if columns is None:
+        # Leave out Platform and CODEX-only columns
+        columns = list(pd.read_csv(DATA_CSV, nrows=0).columns) + ["Sample", "Genotype", "Region"]
+    return load_annotations(columns, platform="Phenocycler", cache=cache)
+
+
+def load_all_data(columns=None, cache=True) -> pd.DataFrame:
+    """Load AnnotationsFinal.csv + ForSH2B3.csv (CODEX), harmonized.
+
+    Returns combined DataFrame with Sample, Genotype, Platform columns.
+    See load_annotations for ``columns`` and ``cache``.
+    """
+    return load_annotations(columns, cache=cache)
+
+
+# ---------------------------------------------------------------------------
+# Cells.csv streaming (H14, H17)
+# ---------------------------------------------------------------------------
+# CSV bytes parsed per block while converting Cells.csv
+_CELLS_BLOCK_SIZE = 64 << 20
+
+
+def _cells_column_types(path: Path) -> dict:
+    """Arrow types for Cells.csv: float32 for every numeric column, strings as-is.
+
+    Types are inferred from the first block only, then forced for the whole
+    file so later blocks cannot change them.
+    """
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+
+    reader = pacsv.open_csv(path, read_options=pacsv.ReadOptions(block_size=_CELLS_BLOCK_SIZE))
+    types = {}
+    for field in reader.schema:
+        numeric = (pa.types.is_floating(field.type) or pa.types.is_integer(field.type)
+                   or pa.types.is_null(field.type))
+        types[field.name] = pa.float32() if numeric else pa.string()
+    reader.close()
+    types["Image"] = pa.string()
+    return types
+
+
+def cells_dataset(rebuild: bool = False):
+    """Cells.csv as a Parquet dataset partitioned by Image (a pyarrow Dataset).
+
+    The first call streams Cells.csv block by block into
+    analysis/cache/cells/Image=<name>/, storing numeric columns as float32;
+    memory stays at one block however large the CSV is. The dataset is
+    rebuilt when Cells.csv changes size or mtime.
+    """
+    import shutil
+
+    import pyarrow as pa
+    import pyarrow.csv as pacsv
+    import pyarrow.dataset as ds
+
+    path = CACHE_DIR / "cells"
+    stamp_path = path / "_source.json"
+    st = CELLS_CSV.stat()
+    stamp = {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+    if rebuild or not stamp_path.exists() or json.loads(stamp_path.read_text()) != stamp:
+        tmp = CACHE_DIR / "cells.tmp"
+        shutil.rmtree(tmp, ignore_errors=True)
+        reader = pacsv.open_csv(
+            CELLS_CSV,
+            read_options=pacsv.ReadOptions(block_size=_CELLS_BLOCK_SIZE),
+            convert_options=pacsv.ConvertOptions(column_types=_cells_column_types(CELLS_CSV)),
+        )
+        ds.write_dataset(
+            reader, tmp, format="parquet",
+            partitioning=ds.partitioning(pa.schema([("Image", pa.string())]), flavor="hive"),
+        )
+        (tmp / "_source.json").write_text(json.dumps(stamp))
+        shutil.rmtree(path, ignore_errors=True)
+        tmp.rename(path)
+    return ds.dataset(path, format="parquet", partitioning="hive")
+
+
+def cells_images(dataset=None) -> list[str]:
+    """Image names present in the Cells dataset."""
+    import pyarrow.dataset as ds
+
+    dataset = cells_dataset() if dataset is None else dataset
+    images = {ds.get_partition_keys(f.partition_expression)["Image"]
+              for f in dataset.get_fragments()}
+    return sorted(images)
+
+
+def _cells_filter(image, crop=None, qc=None):
+    """Arrow filter expression for one image, its crop window and QC bounds."""
+    import pyarrow.dataset as ds
+
+    expr = ds.field("Image") == image
+    bounds = dict(qc or {})
+    if crop is not None:
+        x_min, x_max, y_min, y_max = crop
+        bounds["Centroid X µm"] = (x_min, x_max)
+        bounds["Centroid Y µm"] = (y_min, y_max)
+    for col, (lo, hi) in bounds.items():
+        if lo is not None:
+            expr &= ds.field(col) >= lo
+        if hi is not None:
+            expr &= ds.field(col) <= hi
+    return expr
+
+
+def iter_cells(columns=None, images=None, crop_windows=None, qc=None):
+    """Stream Cells.csv one image at a time with pushed-down filters.
+
+    Parameters
+    ----------
+    columns : columns to read (default: all); e.g. coordinates + markers
+    images : image names to read (default: every image in the dataset)
+    crop_windows : {image: (x_min, x_max, y_min, y_max)} in µm; images
+        missing from the dict (or mapped to None) are read uncropped
+    qc : {column: (min, max)} inclusive bounds, None for an open side
+
+    Yields
+    ------
+    (image, DataFrame) with float32 measurements and a categorical Image
+    column (when requested); filtering happens in Arrow before conversion,
+    so only the surviving rows of one image are ever materialized.
+    """
+    dataset = cells_dataset()
+    images = cells_images(dataset) if images is None else sorted(images)
+    crop_windows = crop_windows or {}
+    for image in images:
+        table = dataset.to_table(
+            columns=columns,
+            filter=_cells_filter(image, crop_windows.get(image), qc),
+        )
+        df = table.to_pandas()
+        if "Image" in df.columns:
+            df["Image"] = df["Image"].astype("category")
+        yield image, df
+
+
 # ---------------------------------------------------------------------------
 # Filtering helpers
 # ---------------------------------------------------------------------------
@@ -191,10 +551,20 @@ def get_regions(df: pd.DataFrame) -> pd.DataFrame:
 def get_vessels(df: pd.DataFrame) -> pd.DataFrame:
     """Return SmallVessel annotations with a Region column parsed from Parent."""
     v = df[df["Classification"] == "SmallVessel"].copy()
-    v["Region"] = v["Parent"].str.extract(r"Annotation \((\w+)\)")
+    v["Region"] = _parent_region(v["Parent"])
     return v
 
 
+def _parent_region(parent: pd.Series) -> pd.Series:
+    """Region name from "Annotation (<Region>)" Parent values.
+
+    The regex runs once per distinct Parent value, not once per row.
+    """
+    codes, uniques = pd.factorize(parent)
+    regions = pd.Series(uniques).str.extract(r"Annotation \((\w+)\)", expand=False)
+    return pd.Series(regions.reindex(codes).to_numpy(), index=parent.index, name="Region")
+
+
 # ---------------------------------------------------------------------------
 # Density computation
 # ---------------------------------------------------------------------------
@@ -250,6 +620,8 @@ def assign_vessels_to_follicles(df: pd.DataFrame, image: str) -> pd.DataFrame:
     Uses cKDTree for fast nearest-neighbor lookup.
     Returns vessel DataFrame with Follicle_ID and Follicle_Area columns.
     """
+    from scipy.spatial import cKDTree
+
     img_df = df[df["Image"] == image]
     follicles = img_df[img_df["Classification"] == "Follicle"].copy()
     vessels = get_vessels(img_df)
@@ -272,11 +644,262 @@ def assign_vessels_to_follicles(df: pd.DataFrame, image: str) -> pd.DataFrame:
     return vessels
 
 
+def assign_vessels_to_follicles_all(df: pd.DataFrame, workers: int | None = None):
+    """assign_vessels_to_follicles for every image in one call.
+
+    Rows are grouped by image once (stable sort of the Image codes) instead
+    of re-filtering the frame per image; the per-image cKDTrees are built
+    and queried on ``workers`` threads, and per-follicle vessel counts come
+    from one np.bincount over the whole dataset.
+
+    Returns (vessels, follicles), both ordered as looping over
+    df["Image"].unique() would give:
+      vessels   — follicle-parented SmallVessels with Follicle_ID and
+                  Follicle_Area (the concatenated assign_vessels_to_follicles
+                  results)
+      follicles — every Follicle annotation with its Vessel_Count,
+                  including follicles with no vessels
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    from scipy.spatial import cKDTree
+
+    image_codes, images = pd.factorize(df["Image"])
+    fol_rows = np.flatnonzero((df["Classification"] == "Follicle").to_numpy() & (image_codes >= 0))
+    ves_rows = np.flatnonzero((df["Classification"] == "SmallVessel").to_numpy() & (image_codes >= 0))
+    ves_rows = ves_rows[(_parent_region(df["Parent"].iloc[ves_rows]) == "Follicle").to_numpy()]
+    fol_rows = fol_rows[np.argsort(image_codes[fol_rows], kind="stable")]
+    ves_rows = ves_rows[np.argsort(image_codes[ves_rows], kind="stable")]
+    fol_bounds = np.searchsorted(image_codes[fol_rows], np.arange(len(images) + 1))
+    ves_bounds = np.searchsorted(image_codes[ves_rows], np.arange(len(images) + 1))
+    xy = df[["Centroid X µm", "Centroid Y µm"]].to_numpy(dtype=float)
+
+    def nearest(image):
+        """Index (into fol_rows) of the nearest follicle for each vessel of one image."""
+        f0, f1 = fol_bounds[image], fol_bounds[image + 1]
+        v0, v1 = ves_bounds[image], ves_bounds[image + 1]
+        if f0 == f1 or v0 == v1:
+            return np.empty(0, dtype=np.intp)
+        _, indices = cKDTree(xy[fol_rows[f0:f1]]).query(xy[ves_rows[v0:v1]])
+        return f0 + indices
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        fol_index = np.concatenate([np.empty(0, dtype=np.intp),
+                                    *pool.map(nearest, range(len(images)))])
+
+    # Vessels of images without follicles stay unassigned (dropped)
+    ves_rows = ves_rows[np.repeat(np.diff(fol_bounds) > 0, np.diff(ves_bounds))]
+    follicles = df.iloc[fol_rows].copy()
+    follicles["Vessel_Count"] = np.bincount(fol_index, minlength=len(fol_rows))
+    vessels = df.iloc[ves_rows].copy()
+    vessels["Region"] = "Follicle"
+    vessels["Follicle_ID"] = follicles["Object ID"].to_numpy()[fol_index]
+    vessels["Follicle_Area"] = follicles["Area µm^2"].to_numpy()[fol_index]
+    return vessels, follicles
+
+
+# ---------------------------------------------------------------------------
+# Point-in-polygon assignment from GeoJSON region exports
+# ---------------------------------------------------------------------------
+# Points binned and tested per chunk (and per worker task) in _first_containing
+_POLYGON_CHUNK = 1 << 20
+
+
+def geojson_path(image: str) -> Path:
+    """GeoJSON file written by export_regions_geojson.groovy for an image."""
+    base = re.sub(r"\.tiff?$", "", re.sub(r"\.ome\.tiff?$", "", image))
+    return GEOJSON_DIR / f"{base}.geojson"
+
+
+@functools.lru_cache(maxsize=64)
+def _region_polygons(path: str, stamp: tuple, pixel_size: float) -> pd.DataFrame:
+    """Parsed polygons of one GeoJSON file, memoized per file stamp."""
+    import shapely
+
+    with open(path) as fh:
+        features = json.load(fh).get("features", [])
+    geoms = shapely.from_geojson([json.dumps(f["geometry"]) for f in features])
+    geoms = np.asarray(shapely.transform(geoms, lambda xy: xy * pixel_size), dtype=object)
+    invalid = ~shapely.is_valid(geoms)
+    geoms[invalid] = shapely.make_valid(geoms[invalid])
+    return pd.DataFrame({
+        "Object ID": [f.get("id") for f in features],
+        "Classification": [(f.get("properties", {}).get("classification") or {}).get("name")
+                           for f in features],
+        "geometry": geoms,
+        "Area µm^2": shapely.area(geoms),
+    })
+
+
+def load_region_polygons(image: str, classes=("Follicle",), pixel_size: float | None = None):
+    """Region polygons of one image in µm, from its exported GeoJSON.
+
+    Parameters
+    ----------
+    image : image name as in the Image column
+    classes : classifications to keep (None for all)
+    pixel_size : µm per pixel; default PIXEL_SIZE_UM for the image's platform
+
+    Returns
+    -------
+    DataFrame with Object ID (joins the annotation table), Classification,
+    geometry (shapely, made valid) and Area µm^2, in file order; empty when
+    the image has no GeoJSON file.
+    """
+    path = geojson_path(image)
+    if not path.exists():
+        return pd.DataFrame(columns=["Object ID", "Classification", "geometry", "Area µm^2"])
+    if pixel_size is None:
+        platform = "CODEX" if extract_sample_id(image) in CODEX_SAMPLES else "Phenocycler"
+        pixel_size = PIXEL_SIZE_UM[platform]
+    st = path.stat()
+    polygons = _region_polygons(str(path), (st.st_size, st.st_mtime_ns), float(pixel_size))
+    if classes is not None:
+        polygons = polygons[polygons["Classification"].isin(list(classes))]
+    return polygons.reset_index(drop=True)
+
+
+def _grid_candidates(tree, bounds, x, y):
+    """(point, polygon) pairs whose grid cell meets the polygon's bounding box.
+
+    Points are bucketed on a square grid (cells about half a polygon wide)
+    and only the occupied cells are queried against the STRtree, so no
+    shapely Point is ever built; the pairs are expanded with NumPy.
+    """
+    import shapely
+
+    x0, y0 = x.min(), y.min()
+    span_x, span_y = x.max() - x0, y.max() - y0
+    extent = np.maximum(bounds[:, 2] - bounds[:, 0], bounds[:, 3] - bounds[:, 1])
+    # At least ~1 point per cell on average, and never a zero-width cell
+    cell = max(0.5 * np.median(extent), math.sqrt(span_x * span_y / len(x)),
+               max(span_x, span_y) / 4096, 1e-9)
+    nx = int(span_x // cell) + 1
+    key = (y - y0) // cell * nx + (x - x0) // cell
+    key = key.astype(np.intp)
+    order = np.argsort(key, kind="stable")
+    key = key[order]
+    occupied, first = np.unique(key, return_index=True)
+    counts = np.diff(np.r_[first, len(key)])
+
+    gx, gy = occupied % nx, occupied // nx
+    boxes = shapely.box(x0 + gx * cell, y0 + gy * cell, x0 + (gx + 1) * cell, y0 + (gy + 1) * cell)
+    cells, polys = tree.query(boxes)
+    pair = np.repeat(np.arange(len(cells)), counts[cells])
+    offset = np.arange(len(pair)) - np.repeat(np.cumsum(counts[cells]) - counts[cells], counts[cells])
+    return order[first[cells][pair] + offset], polys[pair]
+
+
+def _first_containing(geoms: np.ndarray, x: np.ndarray, y: np.ndarray,
+                      workers: int = 1) -> np.ndarray:
+    """Index of the first polygon (lowest index) containing each point, -1 if none.
+
+    Grid/STRtree candidates (_grid_candidates) are filtered with one bulk
+    shapely.contains_xy call per _POLYGON_CHUNK points; boundary points and
+    non-finite coordinates are outside. Chunks are split over ``workers``
+    threads, each with its own copy of the polygons and tree (GEOS prepared
+    geometries are not shared between threads).
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    import shapely
+
+    result = np.full(len(x), -1, dtype=np.intp)
+    valid = np.flatnonzero(np.isfinite(x) & np.isfinite(y))
+    if not len(geoms) or not len(valid):
+        return result
+    wkb = shapely.to_wkb(geoms)
+    starts = range(0, len(valid), _POLYGON_CHUNK)
+    workers = max(1, min(workers or 1, len(starts)))
+
+    def run(worker):
+        """Assign every ``workers``-th chunk, starting at chunk ``worker``."""
+        own = shapely.from_wkb(wkb)
+        tree = shapely.STRtree(own)
+        shapely.prepare(own)
+        bounds = shapely.bounds(own)
+        for start in starts[worker::workers]:
+            rows = valid[start:start + _POLYGON_CHUNK]
+            cx, cy = x[rows], y[rows]
+            pt, poly = _grid_candidates(tree, bounds, cx, cy)
+            inside = shapely.contains_xy(own[poly], cx[pt], cy[pt])
+            pt, poly = pt[inside], poly[inside]
+            # Overlapping polygons: keep the lowest polygon index
+            order = np.lexsort((poly, pt))
+            pt, poly = pt[order], poly[order]
+            _, first = np.unique(pt, return_index=True)
+            result[rows[pt[first]]] = poly[first]
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        list(pool.map(run, range(workers)))
+    return result
+
+
+def assign_to_region_polygons(df: pd.DataFrame, classes=("Follicle",), workers: int | None = None,
+                              pixel_size: float | None = None):
+    """Assign object centroids to the exported region polygons containing them.
+
+    Point-in-polygon replacement for the nearest-centroid rule of
+    assign_vessels_to_follicles: each image's GeoJSON is loaded once, and
+    its centroids are tested in bulk against an STRtree of the polygons.
+    Images are processed on ``workers`` threads (shapely releases the GIL).
+
+    Parameters
+    ----------
+    df : rows with Image, Centroid X µm and Centroid Y µm — e.g. vessels
+        from the annotation table or cells from iter_cells
+    classes : polygon classifications to assign to (None for all)
+    workers : threads (default: ThreadPoolExecutor's)
+    pixel_size : µm per pixel for every image (default: per platform)
+
+    Returns
+    -------
+    assigned : Series aligned with ``df`` giving the Object ID of the
+        containing polygon (NaN outside every polygon or without a
+        GeoJSON file); where polygons overlap, the first one in the file wins
+    regions : one row per polygon — Image, Object ID, Classification,
+        Area µm^2 (polygon area) and Count (objects assigned to it)
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    image_codes, images = pd.factorize(df["Image"])
+    rows = np.argsort(image_codes, kind="stable")
+    rows = rows[image_codes[rows] >= 0]
+    bounds = np.searchsorted(image_codes[rows], np.arange(len(images) + 1))
+    x = df["Centroid X µm"].to_numpy(dtype=float)
+    y = df["Centroid Y µm"].to_numpy(dtype=float)
+
+    def assign(image):
+        """(polygons, containing-polygon index per row) for one image."""
+        polygons = load_region_polygons(images[image], classes, pixel_size)
+        polygons.insert(0, "Image", images[image])
+        sel = rows[bounds[image]:bounds[image + 1]]
+        return polygons, _first_containing(polygons["geometry"].to_numpy(), x[sel], y[sel])
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        results = list(pool.map(assign, range(len(images))))
+
+    columns = ["Image", "Object ID", "Classification", "Area µm^2"]
+    offsets = np.cumsum([0] + [len(polygons) for polygons, _ in results])
+    index = np.full(len(df), -1, dtype=np.intp)
+    for image, (_, hits) in enumerate(results):
+        index[rows[bounds[image]:bounds[image + 1]]] = np.where(hits >= 0, hits + offsets[image], -1)
+    regions = (pd.concat([polygons[columns] for polygons, _ in results], ignore_index=True)
+               if results else pd.DataFrame(columns=columns))
+    regions["Count"] = np.bincount(index[index >= 0], minlength=len(regions))
+    # index -1 (unassigned) picks the trailing None
+    ids = np.append(regions["Object ID"].to_numpy(dtype=object), None)
+    assigned = pd.Series(ids[index], index=df.index, name="Region_ID")
+    return assigned, regions
+
+
 # ---------------------------------------------------------------------------
 # Statistical helpers
 # ---------------------------------------------------------------------------
 def rank_biserial(x, y):
     """Rank-biserial effect size: r = 1 - 2U/(n1*n2)."""
+    from scipy.stats import mannwhitneyu
+
     u_stat, _ = mannwhitneyu(x, y, alternative="two-sided")
     n1, n2 = len(x), len(y)
     return 1 - 2 * u_stat / (n1 * n2)
@@ -287,6 +910,8 @@ def run_kruskal(data: pd.DataFrame, value_col: str, group_col: str = "Genotype")
 
     Returns (H_statistic, p_value) or (NaN, NaN) if <2 groups have data.
     """
+    from scipy.stats import kruskal
+
     groups = [g[value_col].dropna().values for _, g in data.groupby(group_col, observed=True)]
     groups = [g for g in groups if len(g) > 0]
     if len(groups) < 2:
@@ -300,6 +925,8 @@ def run_pairwise(data: pd.DataFrame, value_col: str, group_col: str = "Genotype"
 
     Returns list of dicts with keys: Comparison, U, p, r, n1, n2.
     """
+    from scipy.stats import mannwhitneyu
+
     results = []
     groups = data.groupby(group_col, observed=True)[value_col]
     group_dict = {name: g.dropna().values for name, g in groups}
@@ -323,6 +950,8 @@ def run_dosage_trend(data: pd.DataFrame, value_col: str, group_col: str = "Genot
 
     Returns (rho, p_value).
     """
+    from scipy.stats import spearmanr
+
     ordinal = data[group_col].map({"C/C": 0, "C/T": 1, "T/T": 2})
     valid = ordinal.notna() & data[value_col].notna()
     if valid.sum() < 3:
@@ -330,19 +959,593 @@ def run_dosage_trend(data: pd.DataFrame, value_col: str, group_col: str = "Genot
     return spearmanr(ordinal[valid], data.loc[valid, value_col])
 
 
-def full_stats_table(data: pd.DataFrame, value_col: str, label: str = ""):
-    """Run all three statistical tests and return a summary DataFrame."""
-    h, kw_p = run_kruskal(data, value_col)
-    pw = run_pairwise(data, value_col)
-    rho, sp_p = run_dosage_trend(data, value_col)
+def full_stats_table(data: pd.DataFrame, value_col: str, label: str = "",
+                     permutations: int | None = None, seed: int = 0, workers: int = 1):
+    """Run all three statistical tests and return a summary DataFrame.
+
+    Same results as run_kruskal, run_pairwise and run_dosage_trend; computed
+    by batch_stats (see full_stats_tables for several metrics at once). With
+    ``permutations=N`` the p column holds permutation p-values instead
+    (exact when there are at most N label arrangements; see permutation_stats).
+    """
+    return full_stats_tables(data, [value_col], labels=[label], permutations=permutations,
+                             seed=seed, workers=workers)
+
+
+# ---------------------------------------------------------------------------
+# Batch statistics (many metrics at once)
+# ---------------------------------------------------------------------------
+def _rank_columns(x: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+    """Average ranks down each column of a 2D array, ignoring NaNs.
+
+    Returns (ranks, tie_term): 1-based ranks among each column's non-NaN
+    values (NaN where ``x`` is NaN) and the per-column sum of t**3 - t over
+    tied runs used by the Kruskal-Wallis and Mann-Whitney tie corrections.
+    """
+    n, m = x.shape
+    order = np.argsort(x, axis=0, kind="stable")  # NaNs sort last
+    xs = np.take_along_axis(x, order, axis=0).T
+    # Runs of equal values, laid out column by column so no run spans two
+    # columns; NaN != NaN makes every NaN a run of its own
+    new_run = np.ones((m, n), dtype=bool)
+    new_run[:, 1:] = xs[:, 1:] != xs[:, :-1]
+    new_run = new_run.ravel()
+    run = np.cumsum(new_run) - 1
+    size = np.bincount(run).astype(float)
+    start = np.tile(np.arange(n), m)[new_run]
+    ranks = np.empty_like(x, dtype=float)
+    np.put_along_axis(ranks, order, (start + (size + 1) / 2)[run].reshape(m, n).T, axis=0)
+    ranks[np.isnan(x)] = np.nan
+    run_col = np.repeat(np.arange(m), n)[new_run]
+    tie_term = np.bincount(run_col, weights=size ** 3 - size, minlength=m)
+    return ranks, tie_term
+
+
+@functools.lru_cache(maxsize=None)
+def _mwu_exact_counts(n1: int, n2: int) -> np.ndarray:
+    """Number of orderings of n1 + n2 distinct values giving each U = 0..n1*n2.
+
+    These are the coefficients of the Gaussian binomial [n1+n2 choose n1]_q,
+    built one factor (1 - q**(n-k+i)) / (1 - q**i) at a time.
+    """
+    n, k = n1 + n2, min(n1, n2)
+    counts = np.zeros(n1 * n2 + 1)
+    counts[0] = 1
+    for i in range(1, k + 1):
+        a = n - k + i
+        if a < counts.size:
+            counts[a:] -= counts[:-a].copy()
+        for r in range(i):
+            counts[r::i] = np.cumsum(counts[r::i])
+    return counts
+
+
+def _mwu_pvalues(u1, n1, n2, tie_term) -> np.ndarray:
+    """Two-sided Mann-Whitney p-values, chosen like scipy's method="auto".
+
+    Exact (from _mwu_exact_counts) when either group has <= 8 values and
+    there are no ties, otherwise the tie-corrected normal approximation with
+    continuity correction.
+    """
+    from scipy.special import ndtr
+
+    u = np.maximum(u1, n1 * n2 - u1)
+    n = n1 + n2
+    with np.errstate(divide="ignore", invalid="ignore"):
+        s = np.sqrt(n1 * n2 / 12 * ((n + 1) - tie_term / (n * (n - 1))))
+        p = 2 * ndtr(-(u - n1 * n2 / 2 - 0.5) / s)
+    exact = ((n1 <= 8) | (n2 <= 8)) & (tie_term == 0) & (n1 > 0) & (n2 > 0)
+    for a, b in set(zip(n1[exact].tolist(), n2[exact].tolist())):
+        sel = exact & (n1 == a) & (n2 == b)
+        counts = _mwu_exact_counts(int(a), int(b))
+        sf = np.cumsum(counts[::-1])[::-1] / counts.sum()
+        p[sel] = 2 * sf[np.rint(u[sel]).astype(int)]
+    return np.clip(p, 0, 1)
+
+
+def _kw_h(rank_sums, group_n, n, tie_term):
+    """Tie-corrected Kruskal-Wallis H from per-group rank sums (groups on axis 0)."""
+    with np.errstate(divide="ignore", invalid="ignore"):
+        ssbn = np.where(group_n > 0, rank_sums ** 2 / group_n, 0).sum(axis=0)
+        return (12 / (n * (n + 1)) * ssbn - 3 * (n + 1)) / (1 - tie_term / (n ** 3 - n))
+
+
+def _stats_inputs(values, groups, order):
+    """(metric names, float matrix, group codes) for batch_stats.
+
+    Codes are positions in ``order`` (-1 for other labels); values of rows
+    without a group are set to NaN so they drop out of every test.
+    """
+    if isinstance(values, pd.DataFrame):
+        metrics = list(values.columns)
+        x = values.to_numpy(dtype=float)
+    else:
+        x = np.asarray(values, dtype=float)
+        metrics = list(range(x.shape[1]))
+    codes = pd.Categorical(np.asarray(groups, dtype=object), categories=order).codes
+    return metrics, np.where(codes[:, None] >= 0, x, np.nan), codes.astype(np.intp)
+
+
+def batch_stats(values, groups, order=GENO_ORDER) -> pd.DataFrame:
+    """Kruskal-Wallis, pairwise Mann-Whitney and Spearman dosage for every metric.
+
+    Equivalent to run_kruskal, run_pairwise and run_dosage_trend applied to
+    each column, but every column is ranked once and the U/H/rho statistics
+    and p-values are computed for all columns together.
 
-    rows = [{"Test": "Kruskal-Wallis", "Metric": label, "Statistic": h, "p": kw_p, "Effect_Size": ""}]
-    for r in pw:
-        rows.append({"Test": f"Mann-Whitney ({r['Comparison']})", "Metric": label,
-                      "Statistic": r["U"], "p": r["p"], "Effect_Size": f"r={r['r']:.3f}"})
-    rows.append({"Test": "Spearman dosage", "Metric": label,
-                  "Statistic": rho, "p": sp_p, "Effect_Size": f"rho={rho:.3f}" if not np.isnan(rho) else ""})
-    return pd.DataFrame(rows)
+    Parameters
+    ----------
+    values : DataFrame or 2D array
+        Sample x metric matrix. NaNs are dropped per column.
+    groups : array-like
+        Group label of each row (e.g. the Genotype column). Rows whose label
+        is not in ``order`` are ignored.
+    order : list
+        Group labels. Pairs are taken in this order and the dosage code of a
+        label is its position (C/C=0, C/T=1, T/T=2 by default).
+
+    Returns
+    -------
+    Long DataFrame with one row per (Metric, Test), tests in full_stats_table
+    order: Statistic, p, Effect (eta² for Kruskal-Wallis, rank-biserial r for
+    Mann-Whitney, rho for Spearman) and n, n1, n2 (group sizes for
+    Mann-Whitney).
+    """
+    from scipy.special import chdtrc, stdtr
+
+    metrics, x, codes = _stats_inputs(values, groups, order)
+    onehot = codes[:, None] == np.arange(len(order))   # rows x groups
+    valid = ~np.isnan(x)
+    group_n = onehot.T.astype(float) @ valid            # groups x metrics
+    n = group_n.sum(axis=0)
+
+    tests, stat, p, effect, n1s, n2s = [], [], [], [], [], []
+
+    # Kruskal-Wallis over every group with data
+    ranks, tie_term = _rank_columns(x)
+    rank_sums = onehot.T.astype(float) @ np.nan_to_num(ranks)
+    k = (group_n > 0).sum(axis=0)
+    h = _kw_h(rank_sums, group_n, n, tie_term)
+    h[k < 2] = np.nan
+    tests.append("Kruskal-Wallis")
+    stat.append(h)
+    p.append(chdtrc(k - 1, h))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        effect.append(np.maximum((h - k + 1) / (n - k), 0))
+    n1s.append(np.full(len(metrics), np.nan))
+    n2s.append(np.full(len(metrics), np.nan))
+
+    # Pairwise Mann-Whitney, ranked within each pair
+    for i, j in itertools.combinations(range(len(order)), 2):
+        pair = (codes == i) | (codes == j)
+        pair_ranks, pair_ties = _rank_columns(np.where(pair[:, None], x, np.nan))
+        n1, n2 = group_n[i], group_n[j]
+        rank_sum = np.where(onehot[:, i, None], np.nan_to_num(pair_ranks), 0).sum(axis=0)
+        u1 = rank_sum - n1 * (n1 + 1) / 2
+        u1[(n1 < 1) | (n2 < 1)] = np.nan
+        tests.append(f"Mann-Whitney ({order[i]} vs {order[j]})")
+        stat.append(u1)
+        p.append(_mwu_pvalues(u1, n1, n2, pair_ties))
+        with np.errstate(divide="ignore", invalid="ignore"):
+            effect.append(1 - 2 * u1 / (n1 * n2))
+        n1s.append(n1)
+        n2s.append(n2)
+
+    # Spearman against the dosage code; the ranks of the codes follow from
+    # the group counts of each column
+    below = np.cumsum(group_n, axis=0) - group_n
+    code_ranks = (below + (group_n + 1) / 2)[np.maximum(codes, 0)]
+    mid = (n + 1) / 2
+    dx = np.where(valid, ranks - mid, 0)
+    dy = np.where(valid, code_ranks - mid, 0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rho = (dx * dy).sum(axis=0) / np.sqrt((dx ** 2).sum(axis=0) * (dy ** 2).sum(axis=0))
+        rho = np.clip(rho, -1, 1)
+        rho[n < 3] = np.nan
+        t = rho * np.sqrt((n - 2) / ((rho + 1) * (1 - rho))).clip(0)
+        tests.append("Spearman dosage")
+        stat.append(rho)
+        p.append(2 * stdtr(n - 2, -np.abs(t)))
+        effect.append(rho)
+    n1s.append(np.full(len(metrics), np.nan))
+    n2s.append(np.full(len(metrics), np.nan))
+
+    return pd.DataFrame({
+        "Metric": np.repeat(np.asarray(metrics, dtype=object), len(tests)),
+        "Test": np.tile(tests, len(metrics)),
+        "Statistic": np.column_stack(stat).ravel(),
+        "p": np.column_stack(p).ravel(),
+        "Effect": np.column_stack(effect).ravel(),
+        "n": np.repeat(n, len(tests)).astype(int),
+        "n1": pd.array(np.column_stack(n1s).ravel(), dtype="Int64"),
+        "n2": pd.array(np.column_stack(n2s).ravel(), dtype="Int64"),
+    })
+
+
+def full_stats_tables(data: pd.DataFrame, value_cols, labels=None,
+                      group_col: str = "Genotype", permutations: int | None = None,
+                      seed: int = 0, workers: int = 1) -> pd.DataFrame:
+    """full_stats_table for several metrics of the same frame, in one batch_stats pass.
+
+    Returns the same rows as concatenating full_stats_table(data, col, label)
+    over ``value_cols`` (``labels`` default to the column names). With
+    ``permutations=N``, p-values come from permutation_stats(n_resamples=N,
+    seed=seed, workers=workers).
+    """
+    labels = list(value_cols) if labels is None else list(labels)
+    if permutations:
+        res = permutation_stats(data[list(value_cols)], data[group_col], n_resamples=permutations,
+                                seed=seed, workers=workers)
+    else:
+        res = batch_stats(data[list(value_cols)], data[group_col])
+    res["Metric"] = np.repeat(labels, len(res) // max(len(labels), 1))
+    effect = np.where(res["Test"].str.startswith("Mann-Whitney"),
+                      "r=" + res["Effect"].map("{:.3f}".format), "")
+    dosage = (res["Test"] == "Spearman dosage") & res["Effect"].notna()
+    effect = np.where(dosage, "rho=" + res["Effect"].map("{:.3f}".format), effect)
+    return pd.DataFrame({"Test": res["Test"], "Metric": res["Metric"],
+                         "Statistic": res["Statistic"], "p": res["p"],
+                         "Effect_Size": effect})
+
+
+# ---------------------------------------------------------------------------
+# Permutation p-values (small groups)
+# ---------------------------------------------------------------------------
+# Label arrangements scored per vectorized block (and per worker task)
+_PERMUTATION_BLOCK = 4096
+
+
+def _label_arrangements(sizes) -> np.ndarray:
+    """Every distinct assignment of group codes 0..k-1 to sum(sizes) rows.
+
+    One arrangement per row of the result; group g gets sizes[g] rows.
+    """
+    n = sum(sizes)
+    if len(sizes) == 1:
+        return np.zeros((1, n), dtype=np.intp)
+    rest = _label_arrangements(sizes[1:]) + 1
+    first = np.array(list(itertools.combinations(range(n), sizes[0])), dtype=np.intp)
+    keep = np.ones((len(first), n), dtype=bool)
+    keep[np.arange(len(first))[:, None], first] = False
+    others = np.nonzero(keep)[1].reshape(len(first), n - sizes[0])
+    out = np.zeros((len(first), len(rest), n), dtype=np.intp)
+    out[np.arange(len(first))[:, None, None], np.arange(len(rest))[None, :, None],
+        others[:, None, :]] = rest[None]
+    return out.reshape(len(first) * len(rest), n)
+
+
+def _permutation_pvalues(ranks, codes, n_groups, statistic, n_resamples, seed, workers):
+    """Permutation p-values of ``statistic`` for every column of ``ranks``.
+
+    ``statistic`` maps per-group rank sums (groups x arrangements x columns)
+    to values where larger is more extreme. When the labels have at most
+    ``n_resamples`` distinct arrangements all of them are scored (exact
+    p-value); otherwise ``n_resamples`` shuffles are drawn from ``seed`` and
+    p = (hits + 1) / (n_resamples + 1), as in scipy.stats.permutation_test.
+    Returns (p-values, exact).
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    def rank_sums(labels):
+        return np.stack([(labels == g).astype(float) @ ranks for g in range(n_groups)])
+
+    sizes = np.bincount(codes, minlength=n_groups)
+    n_arrangements = math.factorial(len(codes)) // math.prod(math.factorial(s) for s in sizes)
+    observed = statistic(rank_sums(codes[None]))[0]
+    # Same relative tolerance as scipy.stats.permutation_test
+    threshold = observed - np.abs(observed) * 100 * np.finfo(float).eps
+    exact = n_arrangements <= n_resamples
+
+    if exact:
+        arrangements = _label_arrangements(sizes.tolist())
+        blocks = [arrangements[i:i + _PERMUTATION_BLOCK]
+                  for i in range(0, n_arrangements, _PERMUTATION_BLOCK)]
+    else:
+        # One random stream per block, so results do not depend on workers
+        streams = np.random.SeedSequence(seed).spawn(-(-n_resamples // _PERMUTATION_BLOCK))
+        blocks = [(stream, min(_PERMUTATION_BLOCK, n_resamples - i * _PERMUTATION_BLOCK))
+                  for i, stream in enumerate(streams)]
+
+    def hits(block):
+        if not exact:
+            stream, size = block
+            block = np.random.default_rng(stream).permuted(np.tile(codes, (size, 1)), axis=1)
+        return (statistic(rank_sums(block)) >= threshold).sum(axis=0)
+
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        total = sum(pool.map(hits, blocks))
+    p = total / n_arrangements if exact else (total + 1) / (n_resamples + 1)
+    return np.where(np.isnan(observed), np.nan, p), exact
+
+
+def permutation_stats(values, groups, order=GENO_ORDER, n_resamples: int = 9999,
+                      seed: int = 0, workers: int = 1) -> pd.DataFrame:
+    """batch_stats with permutation instead of asymptotic p-values.
+
+    For the n≈3–9 per genotype of this cohort the chi²/normal/t
+    approximations behind batch_stats are unreliable. Here each test's p is
+    the fraction of genotype-label arrangements (within the rows that have a
+    value, and within the two groups for Mann-Whitney) whose statistic is at
+    least as extreme as observed: H for Kruskal-Wallis, |U - n1*n2/2| for
+    Mann-Whitney and |rho| for Spearman dosage.
+
+    Arrangements are enumerated exactly when there are at most
+    ``n_resamples`` of them (e.g. 3+3+3 donors: 1680), otherwise
+    ``n_resamples`` Monte-Carlo shuffles are drawn from ``seed``. Blocks of
+    arrangements are scored on ``workers`` threads; the result does not
+    depend on ``workers``.
+
+    Returns the batch_stats table with ``p`` replaced and an ``Exact``
+    column (True where all arrangements were enumerated).
+    """
+    res = batch_stats(values, groups, order)
+    _, x, codes = _stats_inputs(values, groups, order)
+    k = len(order)
+    pairs = list(itertools.combinations(range(k), 2))
+    p = np.full((x.shape[1], 2 + len(pairs)), np.nan)
+    exact = np.zeros(p.shape, dtype=bool)
+
+    def run(col, test, ranks, labels, n_groups, statistic):
+        p[col, test], exact[col, test] = _permutation_pvalues(
+            ranks, labels, n_groups, statistic, n_resamples, [seed, test], workers)
+
+    # Columns with the same missing values share their label arrangements
+    valid = ~np.isnan(x)
+    patterns, pattern_of = np.unique(valid.T, axis=0, return_inverse=True)
+    for pattern, rows in enumerate(patterns):
+        col = np.flatnonzero(pattern_of.ravel() == pattern)
+        labels = codes[rows]
+        ranks, tie_term = _rank_columns(x[rows][:, col])
+        sizes = np.bincount(labels, minlength=k).astype(float)
+        n = float(len(labels))
+
+        if (sizes > 0).sum() >= 2:
+            run(col, 0, ranks, labels, k,
+                lambda s: _kw_h(s, sizes[:, None, None], n, tie_term))
+
+        if n >= 3:
+            # rho's denominator is fixed under relabelling, so its numerator
+            # sum_g (code rank_g - mid) * (rank sum_g - n_g * mid) suffices
+            mid = (n + 1) / 2
+            code_ranks = np.cumsum(sizes) - sizes + (sizes + 1) / 2
+            run(col, 1 + len(pairs), ranks, labels, k,
+                lambda s: np.abs(((code_ranks - mid)[:, None, None]
+                                  * (s - sizes[:, None, None] * mid)).sum(axis=0)))
+
+        for test, (i, j) in enumerate(pairs, start=1):
+            if sizes[i] < 1 or sizes[j] < 1:
+                continue
+            in_pair = (labels == i) | (labels == j)
+            pair_ranks, _ = _rank_columns(x[rows][in_pair][:, col])
+            n1, n2 = sizes[i], sizes[j]
+            run(col, test, pair_ranks, (labels[in_pair] == j).astype(np.intp), 2,
+                lambda s: np.abs(s[0] - n1 * (n1 + 1) / 2 - n1 * n2 / 2))
+
+    res["p"] = np.where(res["Statistic"].isna(), np.nan, p.ravel())
+    res["Exact"] = exact.ravel()
+    return res
+
+
+# ---------------------------------------------------------------------------
+# Bootstrap confidence intervals (vectorized)
+# ---------------------------------------------------------------------------
+def _rank_rows(x: np.ndarray) -> np.ndarray:
+    """Average ranks along the last axis of an N-d array (NaNs stay NaN)."""
+    ranks, _ = _rank_columns(x.reshape(-1, x.shape[-1]).T)
+    return ranks.T.reshape(x.shape)
+
+
+def rank_biserial_rows(x, y):
+    """Rank-biserial r = 1 - 2U/(n1*n2) along the last axis of x and y.
+
+    Vectorized rank_biserial: leading axes (e.g. bootstrap replicates)
+    broadcast against each other and every row is ranked in one pass.
+    NaN when either sample is empty.
+    """
+    x, y = np.asarray(x, dtype=float), np.asarray(y, dtype=float)
+    n1, n2 = x.shape[-1], y.shape[-1]
+    lead = np.broadcast_shapes(x.shape[:-1], y.shape[:-1])
+    if n1 == 0 or n2 == 0:
+        return np.full(lead, np.nan)[()]
+    xy = np.concatenate([np.broadcast_to(x, lead + (n1,)),
+                         np.broadcast_to(y, lead + (n2,))], axis=-1)
+    u1 = _rank_rows(xy)[..., :n1].sum(axis=-1) - n1 * (n1 + 1) / 2
+    return (1 - 2 * u1 / (n1 * n2))[()]
+
+
+def spearman_rows(x, y):
+    """Spearman rho between x and y along the last axis (leading axes broadcast).
+
+    NaN for rows where either variable is constant, like scipy's spearmanr.
+    """
+    x, y = np.broadcast_arrays(np.asarray(x, dtype=float), np.asarray(y, dtype=float))
+    dx = _rank_rows(x)
+    dy = _rank_rows(y)
+    dx -= dx.mean(axis=-1, keepdims=True)
+    dy -= dy.mean(axis=-1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rho = (dx * dy).sum(axis=-1) / np.sqrt((dx ** 2).sum(axis=-1) * (dy ** 2).sum(axis=-1))
+    return np.clip(rho, -1, 1)[()]
+
+
+def _jackknife(a: np.ndarray) -> np.ndarray:
+    """All leave-one-out copies of a 1D array, one per row."""
+    n = len(a)
+    return a[np.nonzero(~np.eye(n, dtype=bool))[1].reshape(n, n - 1)]
+
+
+def bootstrap_ci(statistic, *samples, n_boot: int = 1000, alpha: float = 0.05,
+                 method: str = "percentile", paired: bool = False, seed=None,
+                 return_method: bool = False):
+    """Bootstrap (1 - alpha) CI of ``statistic`` with every resample drawn at once.
+
+    Parameters
+    ----------
+    statistic : callable
+        Vectorized over leading axes: given arrays of shape (..., n_i) it
+        returns shape (...), e.g. rank_biserial_rows or spearman_rows.
+    samples : 1D arrays
+        Resampled independently, or with shared indices if ``paired``
+        (e.g. values and their genotype dosage).
+    method : {"percentile", "bca"}
+        BCa adds bias and acceleration (jackknife) corrections, as in
+        scipy.stats.bootstrap. When they are undefined, e.g. every resample
+        falls on one side of the observed value or the jackknife values are
+        all equal (perfectly separated groups), the percentile interval is
+        returned instead.
+    seed : int, Generator or None
+        Passed to np.random.default_rng.
+    return_method : bool
+        Also return the method actually used ("bca" or "percentile").
+
+    Returns (observed, lo, hi), plus the method if ``return_method``; the
+    bounds are NaN when fewer than 10 resamples give a finite statistic.
+    """
+    from scipy.special import ndtr, ndtri
+
+    if method not in ("percentile", "bca"):
+        raise ValueError(f"Unknown bootstrap method {method!r}")
+
+    def result(lo, hi, used=method):
+        return (observed, lo, hi, used) if return_method else (observed, lo, hi)
+
+    rng = np.random.default_rng(seed)
+    samples = [np.asarray(s, dtype=float) for s in samples]
+    observed = float(statistic(*samples))
+    if not np.isfinite(observed) or min(len(s) for s in samples) == 0:
+        return result(np.nan, np.nan)
+    if paired:
+        idx = rng.integers(0, len(samples[0]), (n_boot, len(samples[0])))
+        boots = statistic(*(s[idx] for s in samples))
+    else:
+        boots = statistic(*(s[rng.integers(0, len(s), (n_boot, len(s)))] for s in samples))
+    boots = boots[np.isfinite(boots)]
+    if len(boots) < 10:
+        return result(np.nan, np.nan)
+
+    levels = np.array([alpha / 2, 1 - alpha / 2])
+    used = method
+    if method == "bca":
+        z0 = ndtri(((boots < observed).sum() + (boots <= observed).sum()) / (2 * len(boots)))
+        if paired:
+            jack = [statistic(*(_jackknife(s) for s in samples))]
+        else:
+            jack = [statistic(*(_jackknife(s) if i == j else s[None] for i, s in enumerate(samples)))
+                    for j in range(len(samples))]
+        u = [(len(t) - 1) * (t.mean() - t) for t in jack]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            accel = (sum((ui ** 3).sum() / len(ui) ** 3 for ui in u)
+                     / (6 * sum((ui ** 2).sum() / len(ui) ** 2 for ui in u) ** 1.5))
+            z = z0 + ndtri(levels)
+            bca_levels = ndtr(z0 + z / (1 - accel * z))
+        if np.isfinite(z0) and np.isfinite(bca_levels).all():
+            levels = bca_levels
+        else:
+            used = "percentile"
+    lo, hi = np.percentile(boots, 100 * levels)
+    return result(lo, hi, used)
+
+
+# ---------------------------------------------------------------------------
+# Power / minimum detectable effect (Monte-Carlo)
+# ---------------------------------------------------------------------------
+POWER_TESTS = ("mannwhitney", "kruskal", "dosage")
+
+
+def _simulated_pvalues(x: np.ndarray, codes: np.ndarray, test: str) -> np.ndarray:
+    """p-value of ``test`` for every column of a simulated (samples x sims) matrix.
+
+    Mann-Whitney compares groups 0 and 1 only; other rows are dropped
+    before ranking.
+    """
+    from scipy.special import chdtrc, stdtr
+
+    if test == "mannwhitney":
+        keep = codes < 2
+        x, codes = x[keep], codes[keep]
+    ranks, tie_term = _rank_columns(x)
+    k = codes.max() + 1
+    sizes = np.bincount(codes, minlength=k).astype(float)
+    rank_sums = np.stack([ranks[codes == g].sum(axis=0) for g in range(k)])
+    n = float(len(codes))
+    if test == "mannwhitney":
+        n1, n2 = (np.full(x.shape[1], s) for s in sizes[:2])
+        return _mwu_pvalues(rank_sums[0] - n1 * (n1 + 1) / 2, n1, n2, tie_term)
+    if test == "kruskal":
+        return chdtrc(k - 1, _kw_h(rank_sums, sizes[:, None], n, tie_term))
+    # Spearman rho against the group code, from the rank sums (see permutation_stats)
+    mid = (n + 1) / 2
+    code_ranks = np.cumsum(sizes) - sizes + (sizes + 1) / 2
+    num = ((code_ranks - mid)[:, None] * (rank_sums - sizes[:, None] * mid)).sum(axis=0)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        rho = num / np.sqrt(((ranks - mid) ** 2).sum(axis=0) * (sizes * (code_ranks - mid) ** 2).sum())
+        t = rho * np.sqrt((n - 2) / ((rho + 1) * (1 - rho))).clip(0)
+    return 2 * stdtr(n - 2, -np.abs(t))
+
+
+def simulate_power(effects, sizes, test: str = "mannwhitney", n_sim: int = 2000,
+                   alpha: float = 0.05, seed=0) -> np.ndarray:
+    """Monte-Carlo power of a rank test at each effect size.
+
+    Parameters
+    ----------
+    effects : float or array-like
+        True rank-biserial r between adjacent groups. Each r becomes a shift
+        d = sqrt(2) * Phi^-1((r + 1) / 2) on standard normals, so that
+        P(X_{g+1} > X_g) = (r + 1) / 2; group g is shifted by g * d (an
+        additive per-allele effect for the three-genotype designs).
+    sizes : tuple of int
+        Group sizes, e.g. (9, 9) or unequal (18, 9) for Mann-Whitney, or
+        (9, 9, 9) for the three-group tests.
+    test : {"mannwhitney", "kruskal", "dosage"}
+        Two-sided Mann-Whitney (first two groups; any others are ignored),
+        Kruskal-Wallis, or Spearman against the group code, with the same
+        p-values as scipy's mannwhitneyu / kruskal / spearmanr. Every test
+        needs at least two non-empty groups.
+    seed : int, Generator or None
+        Every effect uses the same simulated noise (common random numbers),
+        so estimated power is monotone in the effect.
+
+    All n_sim samples for every effect are one (effects, sims, samples)
+    array and are ranked together. Returns the fraction of simulations
+    with p < alpha, per effect.
+    """
+    from scipy.special import ndtri
+
+    if test not in POWER_TESTS:
+        raise ValueError(f"Unknown test {test!r}; expected one of {POWER_TESTS}")
+    if len(sizes) < 2 or min(sizes[:2] if test == "mannwhitney" else sizes) < 1:
+        raise ValueError(f"{test} needs at least two non-empty groups, got sizes {tuple(sizes)}")
+    effects = np.atleast_1d(np.asarray(effects, dtype=float))
+    codes = np.repeat(np.arange(len(sizes)), sizes)
+    noise = np.random.default_rng(seed).standard_normal((n_sim, len(codes)))
+    shift = np.sqrt(2) * ndtri((effects + 1) / 2)
+    sims = noise[None] + shift[:, None, None] * codes           # effects x sims x samples
+    p = _simulated_pvalues(sims.reshape(-1, len(codes)).T, codes, test)
+    return (p < alpha).reshape(len(effects), n_sim).mean(axis=1)
+
+
+def minimum_detectable_effect(sizes, test: str = "mannwhitney", power: float = 0.8,
+                              n_sim: int = 2000, alpha: float = 0.05, tol: float = 0.005,
+                              seed=0) -> float:
+    """Smallest rank-biserial r detected with at least ``power`` (see simulate_power).
+
+    Bisects on r in [0, 0.99] until the bracket is narrower than ``tol``,
+    reusing the same simulated noise at every step. NaN if even r = 0.99
+    is underpowered.
+    """
+    seed = np.random.default_rng(seed).integers(2 ** 63)
+
+    def powered(r):
+        return simulate_power(r, sizes, test, n_sim, alpha, seed)[0] >= power
+
+    lo, hi = 0.0, 0.99
+    if not powered(hi):
+        return np.nan
+    while hi - lo > tol:
+        mid = (lo + hi) / 2
+        lo, hi = (lo, mid) if powered(mid) else (mid, hi)
+    return hi
 
 
 # ---------------------------------------------------------------------------
@@ -350,6 +1553,9 @@ def full_stats_table(data: pd.DataFrame, value_col: str, label: str = ""):
 # ---------------------------------------------------------------------------
 def setup_style():
     """Configure seaborn/matplotlib defaults."""
+    import matplotlib.pyplot as plt
+    import seaborn as sns
+
     sns.set_theme(style="whitegrid", font_scale=1.1)
     plt.rcParams["figure.dpi"] = 100
     plt.rcParams["savefig.dpi"] = 150
@@ -358,6 +1564,7 @@ def setup_style():
 
 def save_figure(fig, name: str, tight=True):
     """Save figure to analysis/figures/ as PNG."""
+    FIGURES_DIR.mkdir(parents=True, exist_ok=True)
     path = FIGURES_DIR / f"{name}.png"
     if tight:
         fig.savefig(path, dpi=150, bbox_inches="tight", facecolor="white")
@@ -368,6 +1575,7 @@ def save_figure(fig, name: str, tight=True):
 
 def save_table(df: pd.DataFrame, name: str):
     """Save DataFrame to analysis/tables/ as CSV."""
+    TABLES_DIR.mkdir(parents=True, exist_ok=True)
     path = TABLES_DIR / f"{name}.csv"
     df.to_csv(path, index=False)
     print(f"Saved: {path.relative_to(PROJECT)}")
@@ -376,49 +1584,18 @@ def save_table(df: pd.DataFrame, name: str):
 # ---------------------------------------------------------------------------
 # Clinical data loading (H8, H10)
 # ---------------------------------------------------------------------------
-def _resolve_sample_from_row(row) -> str | None:
-    """Resolve a Groups.xlsx row to a canonical sample ID."""
-    handel = row.get("HANDEL ID")
-    if pd.notna(handel):
-        return str(handel).strip()
-    alt = row.get("ALT ID")
-    if pd.notna(alt):
-        alt_str = str(int(alt))
-        mapped = _ALT_TO_HANDEL.get(alt_str)
-        if not mapped and len(alt_str) == 5:
-            short = alt_str[:2] + alt_str[3:]
-            mapped = _ALT_TO_HANDEL.get(short)
-        if mapped:
-            return mapped
-    return None
-
-
 def load_clinical() -> pd.DataFrame:
     """Load clinical metadata from Groups.xlsx.
 
     Returns DataFrame with columns: Sample, Genotype, Platform,
     Age (yrs), Gender, Ethnicity, C-pep (ng/ml), HbA1c, BMI.
     """
-    g = pd.read_excel(GROUPS_XLSX)
-    g["Sample"] = g.apply(_resolve_sample_from_row, axis=1)
-    g = g.dropna(subset=["Sample"])
+    g = groups_table()
+    g = g.dropna(subset=["Sample", "Genotype"])
     g = g[~g["Sample"].isin(EXCLUDE_SAMPLES)]
-
-    # Genotype
-    geno_col = "rs3184504" if "rs3184504" in g.columns else "rs3184504 (SH2B3)"
-    g["Genotype"] = g[geno_col].apply(_normalize_genotype)
-    g = g.dropna(subset=["Genotype"])
     g["Genotype"] = pd.Categorical(g["Genotype"], categories=GENO_ORDER, ordered=True)
-
-    # Platform
-    g["Platform"] = g["Sample"].apply(
-        lambda s: "CODEX" if s in CODEX_SAMPLES else "Phenocycler")
-
-    # Clean clinical columns
-    out = g[["Sample", "Genotype", "Platform"] + CLINICAL_COLS].copy()
-    for col in CONTINUOUS_CLINICAL:
-        out[col] = pd.to_numeric(
-            out[col].where(out[col] != "No Data"), errors="coerce")
+    g["Platform"] = np.where(g["Sample"].isin(CODEX_SAMPLES), "CODEX", "Phenocycler")
+    out = g[["Sample", "Genotype", "Platform"] + CLINICAL_COLS]
     return out.reset_index(drop=True)
 
 
@@ -432,49 +1609,22 @@ def load_snp_panel(project_samples=None):
       - geno_df: Sample × SNP matrix of normalized genotype strings
       - dosage_df: Sample × risk-annotated-SNP matrix of 0/1/2 dosage
     """
-    g = pd.read_excel(GROUPS_XLSX)
-    g["Sample"] = g.apply(_resolve_sample_from_row, axis=1)
+    g = groups_table()
+    risk_cols = [c for c in g.columns if c.endswith("_risk_het_prot")]
+    snp_cols = [c for c in g.columns if c.startswith("rs") and c not in risk_cols]
     g = g.dropna(subset=["Sample"])
     g = g[~g["Sample"].isin(EXCLUDE_SAMPLES)]
+    if project_samples:
+        g = g[g["Sample"].isin(project_samples)]
+    # One row per sample: first position, last row's values
+    order = pd.unique(g["Sample"])
+    g = g.drop_duplicates("Sample", keep="last").set_index("Sample").reindex(order)
+    g.index.name = "Sample"
 
-    snp_cols = [c for c in g.columns
-                if c.startswith("rs") and "_risk_het_prot" not in c]
-    risk_cols = {c.replace("_risk_het_prot", ""): c
-                 for c in g.columns if c.endswith("_risk_het_prot")}
-
-    # Build genotype matrix
-    geno_records = {}
-    for _, row in g.iterrows():
-        sid = row["Sample"]
-        if project_samples and sid not in project_samples:
-            continue
-        rec = {}
-        for snp in snp_cols:
-            val = row[snp]
-            rec[snp] = _normalize_genotype(val) if pd.notna(val) else np.nan
-        geno_records[sid] = rec
-    geno_df = pd.DataFrame.from_dict(geno_records, orient="index")
-    geno_df.index.name = "Sample"
-
-    # Build dosage matrix from risk annotations
-    dosage_map = {"Protective": 0, "Het": 1, "Risk": 2}
-    dosage_records = {}
-    for _, row in g.iterrows():
-        sid = row["Sample"]
-        if project_samples and sid not in project_samples:
-            continue
-        rec = {}
-        for snp, risk_col in risk_cols.items():
-            val = row.get(risk_col)
-            if pd.notna(val) and val in dosage_map:
-                rec[snp] = dosage_map[val]
-            else:
-                rec[snp] = np.nan
-        dosage_records[sid] = rec
-    dosage_df = pd.DataFrame.from_dict(dosage_records, orient="index")
-    dosage_df.index.name = "Sample"
-
-    # Drop monomorphic SNPs from dosage
+    geno_df = g[snp_cols]
+
+    # Dosage matrix from risk annotations, minus monomorphic SNPs
+    dosage_df = g[risk_cols].rename(columns=lambda c: c.replace("_risk_het_prot", ""))
     polymorphic = dosage_df.columns[dosage_df.nunique() > 1]
     dosage_df = dosage_df[polymorphic]
 
@@ -488,44 +1638,72 @@ def build_feature_matrix(df: pd.DataFrame) -> pd.DataFrame:
     """Build per-sample morphological feature matrix from annotation data.
 
     Returns ~23 numeric columns indexed by Sample, plus Genotype and Platform.
+
+    Every feature comes from two grouped aggregations over the rows that
+    matter: region annotations by (Sample, Image, Classification) and
+    SmallVessels by Sample and by (Image, Region). Only the needed columns of
+    those rows are read; the full frame is never copied.
     """
-    density = compute_density(df)
-    regions = get_regions(df)
-    vessels = get_vessels(df)
+    area_col = "Area µm^2"
+    cls = df["Classification"]
+
+    # --- Pass 1: region annotation areas and follicle counts ---
+    reg = df.loc[cls.isin(MAIN_REGIONS).to_numpy(),
+                 ["Sample", "Image", "Classification", area_col, "Object ID"]]
+    reg_agg = reg.groupby(["Sample", "Image", "Classification"], observed=True).agg(
+        area=(area_col, "sum"),
+        n_area=(area_col, "count"),
+        n_obj=("Object ID", "count"),
+    )
+    region_areas = (reg_agg["area"].groupby(level=["Sample", "Classification"], observed=True)
+                    .sum().unstack(fill_value=0))
+    region_total = region_areas.sum(axis=1)
+
+    # --- Pass 2: SmallVessels ---
+    vessel_cols = ["Sample", "Image", area_col, "Circularity", "Solidity",
+                   "Max diameter µm", "Min diameter µm"]
+    vessel_cols += ["Region"] if "Region" in df.columns else ["Parent"]
+    sv = df.loc[(cls == "SmallVessel").to_numpy(), vessel_cols]
+    if "Region" in sv.columns:
+        vessel_region = sv["Region"]
+    else:
+        vessel_region = _parent_region(sv["Parent"])
+    in_main = vessel_region.isin(MAIN_REGIONS).to_numpy()
+    vessel_counts = (sv.loc[in_main, "Image"].to_frame()
+                     .assign(Classification=vessel_region[in_main])
+                     .groupby(["Image", "Classification"], observed=True).size())
+
+    # --- Vessel density per image and region (as compute_density) ---
+    area_mm2 = reg_agg["area"] / 1e6
+    counts = vessel_counts.reindex(area_mm2.droplevel("Sample").index, fill_value=0).to_numpy()
+    density = pd.Series(counts / area_mm2.to_numpy(), index=area_mm2.index)
+    redpulp = density.xs("RedPulp", level="Classification", drop_level=True)
+    image_redpulp = redpulp.droplevel("Sample").reindex(density.index.get_level_values("Image"))
+    normalized = density / image_redpulp.to_numpy()
 
     features = {}
 
     # --- Vessel density per region (raw + normalized) ---
     for region in MAIN_REGIONS:
-        rd = density[density["Region"] == region]
-        features[f"{region}_density"] = rd.set_index("Sample")["Density_per_mm2"]
+        in_region = density.index.get_level_values("Classification") == region
+        sample_index = density.index.get_level_values("Sample")[in_region]
+        features[f"{region}_density"] = pd.Series(
+            density.to_numpy()[in_region], index=sample_index)
         if region != "RedPulp":
-            features[f"{region}_norm_density"] = rd.set_index("Sample")["Density_Normalized"]
+            features[f"{region}_norm_density"] = pd.Series(
+                normalized.to_numpy()[in_region], index=sample_index)
 
     # --- Follicle metrics ---
-    follicles = regions[regions["Classification"] == "Follicle"]
-    fol_per_img = follicles.groupby(["Sample"], observed=True).agg(
-        Follicle_count=("Object ID", "count"),
-        Follicle_total_area=("Area µm^2", "sum"),
-        Follicle_mean_area=("Area µm^2", "mean"),
-    )
-    for col in fol_per_img.columns:
-        features[col] = fol_per_img[col]
+    fol = (reg_agg.xs("Follicle", level="Classification")
+           .groupby(level="Sample", observed=True)[["area", "n_area", "n_obj"]].sum())
+    features["Follicle_count"] = fol["n_obj"]
+    features["Follicle_total_area"] = fol["area"]
+    features["Follicle_mean_area"] = fol["area"] / fol["n_area"]
 
     # Follicle fraction of total tissue
-    total_area = regions[regions["Classification"].isin(MAIN_REGIONS)].groupby(
-        "Sample", observed=True)["Area µm^2"].sum()
-    fol_area = follicles.groupby("Sample", observed=True)["Area µm^2"].sum()
-    features["Follicle_fraction"] = fol_area / total_area
+    features["Follicle_fraction"] = fol["area"] / region_total
 
     # --- Tissue proportions ---
-    region_areas = (
-        regions[regions["Classification"].isin(MAIN_REGIONS)]
-        .groupby(["Sample", "Classification"], observed=True)["Area µm^2"]
-        .sum()
-        .unstack(fill_value=0)
-    )
-    region_total = region_areas.sum(axis=1)
     for r in MAIN_REGIONS:
         if r in region_areas.columns:
             features[f"{r}_fraction"] = region_areas[r] / region_total
@@ -540,27 +1718,24 @@ def build_feature_matrix(df: pd.DataFrame) -> pd.DataFrame:
         features["Follicle_PALS_ratio"] = region_areas["Follicle"] / region_areas["PALS"].replace(0, np.nan)
 
     # --- Vessel morphology (median per sample) ---
-    sv = df[df["Classification"] == "SmallVessel"].copy()
     if not sv.empty:
-        sv["Elongation"] = sv["Max diameter µm"] / sv["Min diameter µm"].replace(0, np.nan)
-        morph_agg = sv.groupby("Sample", observed=True).agg(
-            Vessel_median_area=("Area µm^2", "median"),
-            Vessel_median_circularity=("Circularity", "median"),
-            Vessel_median_solidity=("Solidity", "median"),
-            Vessel_median_elongation=("Elongation", "median"),
-        )
-        for col in morph_agg.columns:
-            features[col] = morph_agg[col]
+        morph_agg = (sv[["Sample", area_col, "Circularity", "Solidity"]]
+                     .assign(Elongation=sv["Max diameter µm"]
+                             / sv["Min diameter µm"].replace(0, np.nan))
+                     .groupby("Sample", observed=True).median())
+        features["Vessel_median_area"] = morph_agg[area_col]
+        features["Vessel_median_circularity"] = morph_agg["Circularity"]
+        features["Vessel_median_solidity"] = morph_agg["Solidity"]
+        features["Vessel_median_elongation"] = morph_agg["Elongation"]
 
     # Combine all features
     feat_df = pd.DataFrame(features)
     feat_df.index.name = "Sample"
 
     # Add Genotype and Platform
-    sample_meta = df.drop_duplicates("Sample").set_index("Sample")[["Genotype"]]
+    sample_meta = df[["Sample", "Genotype"]].drop_duplicates("Sample").set_index("Sample")
     feat_df = feat_df.join(sample_meta)
-    feat_df["Platform"] = feat_df.index.map(
-        lambda s: "CODEX" if s in CODEX_SAMPLES else "Phenocycler")
+    feat_df["Platform"] = np.where(feat_df.index.isin(CODEX_SAMPLES), "CODEX", "Phenocycler")
 
     return feat_df
 
@@ -625,6 +1800,8 @@ def platform_diagnostic(feature_df: pd.DataFrame,
 
     Returns DataFrame with Feature, U, p, rank_biserial, n_CODEX, n_PC.
     """
+    from scipy.stats import mannwhitneyu
+
     results = []
     for feat in feature_cols:
         codex = feature_df.loc[feature_df["Platform"] == "CODEX", feat].dropna()
@@ -702,20 +1879,149 @@ def compute_marker_kde(coords, x_range, y_range, grid_spacing=10, bandwidth=75):
     density : 2-D array (ny, nx) of smoothed cell density
     x_edges : 1-D array of bin edges along x
     y_edges : 1-D array of bin edges along y
+
+    For several markers or bandwidths, use bin_marker_counts +
+    smooth_marker_counts (one binning pass, float32 stacks).
     """
     from scipy.ndimage import gaussian_filter
 
-    x_edges = np.arange(x_range[0], x_range[1] + grid_spacing, grid_spacing)
-    y_edges = np.arange(y_range[0], y_range[1] + grid_spacing, grid_spacing)
-    counts, _, _ = np.histogram2d(
-        coords[:, 0], coords[:, 1], bins=[x_edges, y_edges])
-    # histogram2d returns (nx, ny); transpose to (ny, nx) for image convention
-    counts = counts.T
+    counts, x_edges, y_edges = bin_marker_counts(coords, None, x_range, y_range, grid_spacing)
     sigma = bandwidth / grid_spacing
-    density = gaussian_filter(counts.astype(float), sigma=sigma)
+    density = gaussian_filter(counts[0].astype(float), sigma=sigma)
     return density, x_edges, y_edges
 
 
+def _uniform_bin_index(values, edges: np.ndarray) -> np.ndarray:
+    """np.histogram2d bin of each value on evenly spaced ``edges``; -1 outside.
+
+    The arithmetic estimate is corrected against the actual edges, so
+    values on an edge land exactly where np.searchsorted would put them;
+    the last bin is closed on the right.
+    """
+    values = np.asarray(values, dtype=float)
+    n = len(edges) - 1
+    if n < 1:
+        return np.full(len(values), -1, dtype=np.intp)
+    with np.errstate(invalid="ignore"):
+        idx = np.floor((values - edges[0]) / (edges[1] - edges[0]))
+    idx = np.nan_to_num(idx).clip(0, n - 1).astype(np.intp)
+    idx += (values >= edges[idx + 1]).view(np.int8) - (values < edges[idx]).view(np.int8)
+    idx[values == edges[-1]] = n - 1
+    idx[(idx < 0) | (idx >= n) | ~np.isfinite(values)] = -1
+    return idx
+
+
+def bin_marker_counts(coords, weights, x_range, y_range, grid_spacing=10):
+    """Bin cells onto the compute_marker_kde grid for every marker at once.
+
+    The grid index of each cell is computed once (same bins and edge rules
+    as np.histogram2d); each marker is then a weighted np.bincount over the
+    flattened index. Keep the result to sweep bandwidths: only
+    smooth_marker_counts has to be re-run.
+
+    Parameters
+    ----------
+    coords : (N, 2) array of (x, y) positions in µm
+    weights : (N,) or (N, M) array — boolean marker-positive masks or
+        per-cell weights, one column per marker; None counts every cell
+    x_range, y_range : (min, max) in µm
+    grid_spacing : bin size in µm (default 10)
+
+    Returns
+    -------
+    counts : float32 array (M, ny, nx)
+    x_edges, y_edges : 1-D arrays of bin edges
+    """
+    coords = np.asarray(coords)
+    x_edges = np.arange(x_range[0], x_range[1] + grid_spacing, grid_spacing)
+    y_edges = np.arange(y_range[0], y_range[1] + grid_spacing, grid_spacing)
+    nx, ny = len(x_edges) - 1, len(y_edges) - 1
+
+    ix = _uniform_bin_index(coords[:, 0], x_edges)
+    iy = _uniform_bin_index(coords[:, 1], y_edges)
+    keep = (ix >= 0) & (iy >= 0)
+    flat = iy[keep] * nx + ix[keep]
+
+    if weights is None:
+        weights = np.ones((len(coords), 1), dtype=bool)
+    weights = np.asarray(weights)
+    weights = (weights[:, None] if weights.ndim == 1 else weights)[keep]
+    counts = np.empty((weights.shape[1], ny * nx), dtype=np.float32)
+    for m in range(weights.shape[1]):
+        w = weights[:, m]
+        counts[m] = (np.bincount(flat[w], minlength=ny * nx) if w.dtype == bool
+                     else np.bincount(flat, weights=w, minlength=ny * nx))
+    return counts.reshape(-1, ny, nx), x_edges, y_edges
+
+
+def _gaussian_kernel_fft(sigma: float, radius: int, n: int, real: bool) -> np.ndarray:
+    """FFT of scipy.ndimage's truncated, normalized 1-D Gaussian, circularly centered at 0."""
+    k = np.arange(-radius, radius + 1)
+    w = np.exp(-0.5 * (k / sigma) ** 2) if sigma > 0 else (k == 0).astype(float)
+    h = np.zeros(n)
+    h[k % n] = w / w.sum()
+    return np.fft.rfft(h) if real else np.fft.fft(h)
+
+
+def smooth_marker_counts(counts, bandwidth=75, grid_spacing=10, truncate=4.0, workers=None):
+    """Gaussian-smooth a (M, ny, nx) stack of binned counts in float32.
+
+    Same result as scipy.ndimage.gaussian_filter on each plane (reflect
+    boundaries, kernel truncated at ``truncate`` sigma) to float32
+    precision, computed as one FFT convolution of the reflect-padded stack
+    with the separable kernel. The reflect pad is ``truncate`` sigma wide;
+    planes whose kernel radius exceeds the grid itself fall back to
+    gaussian_filter, so memory stays within a few times the grid at any
+    bandwidth.
+
+    Parameters
+    ----------
+    counts : (M, ny, nx) array from bin_marker_counts
+    bandwidth : Gaussian sigma in µm — a scalar or one value per marker
+        (e.g. adaptive per-marker bandwidths)
+    grid_spacing : bin size in µm
+    workers : threads for scipy.fft
+
+    Returns
+    -------
+    density : float32 array (M, ny, nx)
+    """
+    import scipy.fft
+    from scipy.ndimage import gaussian_filter
+
+    counts = np.asarray(counts, dtype=np.float32)
+    n_markers, ny, nx = counts.shape
+    sigmas = np.broadcast_to(np.asarray(bandwidth, dtype=float) / grid_spacing, (n_markers,))
+    radii = np.array([int(truncate * s + 0.5) for s in sigmas], dtype=int)
+    density = np.empty_like(counts)
+
+    # Kernels wider than the grid: an FFT pad of (grid + 2 * radius)² would dwarf
+    # the data, so filter those planes directly
+    direct = radii > max(ny, nx)
+    for m in np.flatnonzero(direct):
+        gaussian_filter(counts[m], sigmas[m], truncate=truncate, output=density[m])
+    fft_planes = np.flatnonzero(~direct)
+    if not len(fft_planes):
+        return density
+
+    pad = int(radii[fft_planes].max())
+    # Zero tail up to a fast FFT length; it never wraps into the cropped output
+    ly = scipy.fft.next_fast_len(ny + 2 * pad)
+    lx = scipy.fft.next_fast_len(nx + 2 * pad, real=True)
+    padded = np.zeros((len(fft_planes), ly, lx), dtype=np.float32)
+    padded[:, :ny + 2 * pad, :nx + 2 * pad] = np.pad(
+        counts[fft_planes], ((0, 0), (pad, pad), (pad, pad)), mode="symmetric")
+
+    spectrum = scipy.fft.rfft2(padded, workers=workers)
+    for i, m in enumerate(fft_planes):
+        kernel = np.outer(_gaussian_kernel_fft(sigmas[m], radii[m], ly, real=False),
+                          _gaussian_kernel_fft(sigmas[m], radii[m], lx, real=True))
+        spectrum[i] *= kernel.astype(np.complex64)
+    density[fft_planes] = scipy.fft.irfft2(spectrum, s=(ly, lx), workers=workers)[
+        :, pad:pad + ny, pad:pad + nx]
+    return density
+
+
 def extract_region_polygons(density, threshold_frac, grid_spacing, x_min, y_min,
                             min_area=8400):
     """Extract contours from density grid and return Shapely polygons.
@@ -733,73 +2039,129 @@ def extract_region_polygons(density, threshold_frac, grid_spacing, x_min, y_min,
     list of shapely.geometry.Polygon in µm coordinates
     """
     from skimage.measure import find_contours
-    from shapely.geometry import Polygon
-    from shapely.validation import make_valid
 
     threshold = threshold_frac * density.max()
     if threshold <= 0:
         return []
+    return _contour_polygons(find_contours(density, threshold), grid_spacing, x_min, y_min, min_area)
 
-    contours = find_contours(density, threshold)
-    polygons = []
-    for contour in contours:
-        if len(contour) < 4:
-            continue
-        # contour is (row, col) → convert to (x_µm, y_µm)
-        coords_um = np.column_stack([
-            contour[:, 1] * grid_spacing + x_min,
-            contour[:, 0] * grid_spacing + y_min,
-        ])
-        poly = Polygon(coords_um)
-        if not poly.is_valid:
-            poly = make_valid(poly)
-        if poly.is_empty or poly.geom_type not in ('Polygon', 'MultiPolygon'):
-            continue
-        if poly.geom_type == 'MultiPolygon':
-            for p in poly.geoms:
-                if p.area >= min_area:
-                    polygons.append(p)
-        elif poly.area >= min_area:
-            polygons.append(poly)
-    return polygons
 
+def _contour_polygons(contours, grid_spacing, x_min, y_min, min_area):
+    """Contours (row, col) → valid µm polygons of at least ``min_area``.
 
-def assign_objects_to_polygons(coords, polygon_dict):
-    """Assign point coordinates to regions via spatial index.
+    Built, repaired (make_valid) and split into parts with bulk shapely
+    calls; contours under 4 points and repairs that are not polygonal are
+    dropped. Parts keep contour order.
+    """
+    import shapely
+
+    contours = [c for c in contours if len(c) >= 4]
+    if not contours:
+        return []
+    rc = np.concatenate(contours)
+    coords_um = np.column_stack([rc[:, 1] * grid_spacing + x_min, rc[:, 0] * grid_spacing + y_min])
+    rings = shapely.linearrings(coords_um, indices=np.repeat(np.arange(len(contours)),
+                                                             [len(c) for c in contours]))
+    polys = shapely.polygons(rings)
+    invalid = ~shapely.is_valid(polys)
+    polys[invalid] = shapely.make_valid(polys[invalid])
+    polygonal = np.isin(shapely.get_type_id(polys),
+                        [shapely.GeometryType.POLYGON, shapely.GeometryType.MULTIPOLYGON])
+    parts = shapely.get_parts(polys[polygonal & ~shapely.is_empty(polys)])
+    return list(parts[shapely.area(parts) >= min_area])
+
+
+def _polygon_cache_path(image, marker, bandwidth, threshold_frac) -> Path:
+    """analysis/cache/region_polygons/<image>/<marker>_bw<bandwidth>_t<threshold>.parquet"""
+    def safe(name):
+        return re.sub(r"[^\w.-]+", "_", str(name))
+    return (CACHE_DIR / "region_polygons" / safe(image)
+            / f"{safe(marker)}_bw{bandwidth:g}_t{threshold_frac:g}.parquet")
+
+
+def extract_region_polygons_multi(density, threshold_fracs, grid_spacing, x_min, y_min,
+                                  min_area=8400, cache_key=None):
+    """extract_region_polygons for several thresholds of one density grid.
 
     Parameters
     ----------
-    coords : (N, 2) array of (x, y) in µm
-    polygon_dict : {region_name: list_of_polygons}
+    density : 2-D smoothed density array (ny, nx)
+    threshold_fracs : fractions of max density to contour (e.g. [0.05, 0.10, 0.25])
+    grid_spacing, x_min, y_min, min_area : as in extract_region_polygons
+    cache_key : (image, marker, bandwidth) to cache each threshold's
+        polygons on disk as
+        analysis/cache/region_polygons/<image>/<marker>_bw<bw>_t<frac>.parquet;
+        a file is reused only if the density grid and other arguments
+        match the ones it was built from. None disables caching.
 
     Returns
     -------
-    labels : array of region name strings (len N), "Unassigned" if outside all
+    {threshold_frac: list of shapely Polygons in µm}, the same lists
+    extract_region_polygons returns for each threshold
     """
-    from shapely.geometry import Point
-    from shapely import STRtree
+    density = np.ascontiguousarray(density)
+    if cache_key is not None:
+        import hashlib
+
+        import pyarrow as pa
+        import pyarrow.parquet as pq
+        import shapely
+
+        digest = hashlib.blake2b(density, digest_size=16)
+        digest.update(json.dumps([_POLYGON_CACHE_VERSION, density.shape, str(density.dtype),
+                                  float(grid_spacing), float(x_min), float(y_min),
+                                  float(min_area)]).encode())
+
+    result = {}
+    for frac in threshold_fracs:
+        if cache_key is not None:
+            path = _polygon_cache_path(*cache_key, frac)
+            key = f"{digest.hexdigest()}:{float(frac)!r}".encode()
+            if path.exists() and (pq.read_schema(path).metadata or {}).get(b"sources") == key:
+                wkb = pq.read_table(path).column("wkb").to_numpy(zero_copy_only=False)
+                result[frac] = list(shapely.from_wkb(wkb))
+                continue
+
+        polygons = extract_region_polygons(density, frac, grid_spacing, x_min, y_min, min_area)
+        result[frac] = polygons
+
+        if cache_key is not None:
+            table = pa.table({"wkb": pa.array(shapely.to_wkb(np.array(polygons, dtype=object)),
+                                              type=pa.binary())})
+            table = table.replace_schema_metadata({b"sources": key})
+            path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = path.with_suffix(".tmp")
+            pq.write_table(table, tmp)
+            os.replace(tmp, path)
+    return result
 
-    n = len(coords)
-    labels = np.full(n, "Unassigned", dtype=object)
 
-    # Build flat list of (polygon, region_name) and STRtree
-    all_polys = []
-    poly_labels = []
-    for region, polys in polygon_dict.items():
-        for p in polys:
-            all_polys.append(p)
-            poly_labels.append(region)
+def assign_objects_to_polygons(coords, polygon_dict, workers: int = 1):
+    """Assign point coordinates to regions via spatial index.
 
-    if not all_polys:
-        return labels
+    Parameters
+    ----------
+    coords : (N, 2) array of (x, y) in µm
+    polygon_dict : {region_name: list_of_polygons}
+    workers : threads testing chunks of points in parallel
+
+    Returns
+    -------
+    labels : array of region name strings (len N), "Unassigned" if outside all.
+        A point inside overlapping polygons gets the region listed first in
+        ``polygon_dict`` (then the first polygon in that region's list).
+    """
+    names = np.array([*polygon_dict, "Unassigned"], dtype=object)
+    polys = [p for region_polys in polygon_dict.values() for p in region_polys]
+    # Region index per polygon; the trailing entry maps "no polygon" (-1)
+    region_of = np.repeat(np.arange(len(polygon_dict) + 1),
+                          [len(p) for p in polygon_dict.values()] + [1])
 
-    tree = STRtree(all_polys)
+    coords = np.asarray(coords, dtype=float).reshape(-1, 2)
+    hits = _first_containing(np.array(polys, dtype=object), coords[:, 0], coords[:, 1], workers)
+    return names[region_of[hits]]
 
-    # Vectorized query: predicate="within" means point.within(polygon)
-    # (shapely 2.x evaluates query_geom.predicate(tree_geom))
-    points = np.array([Point(x, y) for x, y in coords], dtype=object)
-    pt_idx, tree_idx = tree.query(points, predicate="within")
-    for pi, ti in zip(pt_idx, tree_idx):
-        labels[pi] = poly_labels[ti]
 
-    return labels
+# Star imports also export the lazy names (resolved through __getattr__)
+__all__ = sorted({name for name in globals() if not name.startswith("_")}
+                 | set(_LAZY_IMPORTS) | {"GENOTYPE_MAP"})
@@ -27,6 +27,9 @@ These outputs make "underpowered null" visually obvious: a CI that crosses zero
 CODE = """import numpy as np
 from scipy.stats import mannwhitneyu, spearmanr
 
+from data_utils import (bootstrap_ci, minimum_detectable_effect, rank_biserial_rows,
+                        spearman_rows)
+
 rng = np.random.default_rng(20260508)
 N_BOOT = 1000
 
@@ -35,36 +38,8 @@ POWER_METRICS = ["Follicle_Count", "Follicle_Area_Mean_um2",
 PAIRS = [("C/C", "C/T"), ("C/C", "T/T"), ("C/T", "T/T")]
 
 
-def rank_biserial(x, y):
-    if len(x) == 0 or len(y) == 0:
-        return np.nan
-    u, _ = mannwhitneyu(x, y, alternative="two-sided")
-    return 1 - 2 * u / (len(x) * len(y))
-
-
-def bootstrap_ci(stat_fn, *args, n_boot=N_BOOT, alpha=0.05):
-    \"\"\"Percentile bootstrap; resamples each arg array with replacement.\"\"\"
-    obs = stat_fn(*args)
-    boots = np.empty(n_boot)
-    for i in range(n_boot):
-        resampled = [rng.choice(a, size=len(a), replace=True) for a in args]
-        try:
-            boots[i] = stat_fn(*resampled)
-        except Exception:
-            boots[i] = np.nan
-    boots = boots[np.isfinite(boots)]
-    if len(boots) < 10:
-        return obs, np.nan, np.nan
-    lo, hi = np.percentile(boots, [100 * alpha / 2, 100 * (1 - alpha / 2)])
-    return obs, lo, hi
-
-
-def spearman_dosage(values, ordinal):
-    rho, _ = spearmanr(ordinal, values)
-    return rho
-
-
-# Effect-size CIs ------------------------------------------------------------
+# Effect-size CIs (BCa, or percentile where BCa is undefined, e.g. perfectly
+# separated groups; all resamples drawn and ranked in one pass) ---------------
 power_rows = []
 for metric in POWER_METRICS:
     d = per_donor.dropna(subset=[metric, "Genotype"])
@@ -72,58 +47,36 @@ for metric in POWER_METRICS:
     for g1, g2 in PAIRS:
         x = d[d["Genotype"] == g1][metric].values
         y = d[d["Genotype"] == g2][metric].values
-        r, lo, hi = bootstrap_ci(rank_biserial, x, y)
+        r, lo, hi, ci = bootstrap_ci(rank_biserial_rows, x, y, n_boot=N_BOOT, method="bca",
+                                     seed=rng, return_method=True)
         u, p = (mannwhitneyu(x, y, alternative="two-sided") if len(x) and len(y)
                 else (np.nan, np.nan))
         power_rows.append({"Metric": metric, "Test": f"MW {g1} vs {g2}",
-                           "Effect": r, "CI_lo": lo, "CI_hi": hi, "p": p,
+                           "Effect": r, "CI_lo": lo, "CI_hi": hi, "CI_method": ci, "p": p,
                            "n1": len(x), "n2": len(y)})
-    # Spearman dosage
+    # Spearman dosage (donors resampled together with their genotype)
     ordinal = d["Genotype"].astype(str).map({"C/C": 0, "C/T": 1, "T/T": 2}).values
     vals = d[metric].values
-    obs = spearman_dosage(vals, ordinal)
-    boots = []
     n = len(vals)
-    for _ in range(N_BOOT):
-        idx = rng.integers(0, n, size=n)
-        try:
-            boots.append(spearman_dosage(vals[idx], ordinal[idx]))
-        except Exception:
-            pass
-    boots = np.array([b for b in boots if np.isfinite(b)])
-    lo, hi = (np.percentile(boots, [2.5, 97.5]) if len(boots) > 10 else (np.nan, np.nan))
+    obs, lo, hi, ci = bootstrap_ci(spearman_rows, vals, ordinal, n_boot=N_BOOT, method="bca",
+                                   paired=True, seed=rng, return_method=True)
     _, p = spearmanr(ordinal, vals) if n >= 3 else (np.nan, np.nan)
     power_rows.append({"Metric": metric, "Test": "Spearman dosage",
-                       "Effect": obs, "CI_lo": lo, "CI_hi": hi, "p": p,
+                       "Effect": obs, "CI_lo": lo, "CI_hi": hi, "CI_method": ci, "p": p,
                        "n1": n, "n2": np.nan})
 
 power_df = pd.DataFrame(power_rows)
 
 # Minimum-detectable-effect via Monte-Carlo --------------------------------
-def mde_rank_biserial(n_per_group, n_sim=2000, alpha=0.05, target_power=0.8):
-    \"\"\"Smallest |true r| where Mann-Whitney detects at p<alpha with target_power.\"\"\"
-    candidate_rs = np.linspace(0.05, 0.95, 19)
-    rng_local = np.random.default_rng(20260508)
-    for r_true in candidate_rs:
-        # Translate r_true into a location shift on standard normals.
-        # Under shift d on N(0,1), AUC = P(X1<X2) = Phi(d/sqrt(2)),
-        # rank-biserial r = 2*AUC - 1 → d = sqrt(2) * Phi^-1((r+1)/2).
-        from scipy.stats import norm as _norm
-        d = np.sqrt(2) * _norm.ppf((r_true + 1) / 2)
-        n_sig = 0
-        for _ in range(n_sim):
-            x = rng_local.standard_normal(n_per_group)
-            y = rng_local.standard_normal(n_per_group) + d
-            _, p = mannwhitneyu(x, y, alternative="two-sided")
-            n_sig += (p < alpha)
-        power = n_sig / n_sim
-        if power >= target_power:
-            return r_true
-    return np.nan
-
-mde_9_9 = mde_rank_biserial(9, n_sim=2000)
-mde_18_9 = mde_rank_biserial(9, n_sim=2000)  # same n for our cohort; placeholder
+# Bisection on the true rank-biserial r; 2000 simulated cohorts per step,
+# tested in one batch (see data_utils.simulate_power)
+mde_9_9 = minimum_detectable_effect((9, 9), n_sim=2000, seed=20260508)
+mde_18_9 = minimum_detectable_effect((18, 9), n_sim=2000, seed=20260508)  # e.g. C carriers vs T/T
+mde_kw = minimum_detectable_effect((9, 9, 9), test="kruskal", n_sim=2000, seed=20260508)
+mde_dosage = minimum_detectable_effect((9, 9, 9), test="dosage", n_sim=2000, seed=20260508)
 print(f"Minimum-detectable rank-biserial r at n=9/9, alpha=0.05, 80% power: {mde_9_9:.2f}")
+print(f"  at n=18/9: {mde_18_9:.2f}")
+print(f"  per-allele r at n=9/9/9: Kruskal-Wallis {mde_kw:.2f}, Spearman dosage {mde_dosage:.2f}")
 
 power_df.attrs["mde_n9"] = mde_9_9
 save_table(power_df, "HE_power_analysis")
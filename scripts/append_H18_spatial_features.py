@@ -7,7 +7,7 @@ notebook (variable `df`):
   - Lorenz/Gini of follicle area distribution per image
   - Centrality: distance to all-follicles centroid, normalized by sqrt(image follicle bbox area)
 
-Per-donor aggregates → genotype tests via data_utils.full_stats_table.
+Per-donor aggregates → genotype tests via data_utils.full_stats_tables.
 
 Idempotency: the script strips any prior copy of the same `## 8. Centroid-based`
 appendix before re-appending.  The strip is bounded by the next `## ` (top-level)
@@ -109,12 +109,8 @@ print(per_donor_spatial.groupby("Genotype", observed=True)
                        [["Clark_Evans_R", "Gini_area", "Centrality"]].mean().round(3))"""
 
 CODE_STATS = """# Genotype tests on the three new features
-spatial_stats_rows = []
-for metric in ["Clark_Evans_R", "Gini_area", "Centrality"]:
-    spatial_stats_rows.append(
-        full_stats_table(per_donor_spatial, metric, label=metric)
-    )
-spatial_stats = pd.concat(spatial_stats_rows, ignore_index=True)
+spatial_stats = full_stats_tables(per_donor_spatial,
+                                  ["Clark_Evans_R", "Gini_area", "Centrality"])
 save_table(spatial_stats, "HE_spatial_features_stats")
 spatial_stats"""
 
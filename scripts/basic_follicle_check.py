@@ -35,8 +35,8 @@ he["Cohort"] = "H&E"
 # --- Fluorescent cohort (per-follicle) -------------------------------------
 flu = pd.read_csv(PROJECT / "Measurements" / "AnnotationsFinal.csv")
 flu = flu[flu["Classification"] == "Follicle"].copy()
-flu["Sample"] = flu["Image"].apply(du.extract_sample_id)
-flu_geno_map = du._build_genotype_map()
+flu["Sample"] = du.sample_ids(flu["Image"])
+flu_geno_map = du.GENOTYPE_MAP
 flu["Genotype"] = flu["Sample"].map(flu_geno_map)
 flu = flu.dropna(subset=["Genotype"])
 # Use the area column from this CSV
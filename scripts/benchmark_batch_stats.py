@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""Timing benchmark for data_utils.batch_stats / full_stats_tables.
+
+Builds a synthetic donor x metric matrix (27 donors split over the three
+rs3184504 genotypes, tied and missing values included) and times the
+per-metric loop over the original scipy-based full_stats_table against one
+full_stats_tables call, checking that both give the same table.
+
+With --permutations N, also times permutation_stats (N Monte-Carlo label
+shuffles for every test and metric) against a Python loop of N spearmanr
+calls for the dosage test of a single metric.
+
+With --power N, also checks the simulate_power p-values for N simulated
+9/9/9 cohorts against scipy's mannwhitneyu (groups 0 and 1), kruskal and
+spearmanr, and times simulate_power for each test.
+
+Usage:
+    python benchmark_batch_stats.py [--donors 27] [--metrics 200] [--repeat 3]
+        [--permutations 10000] [--workers 4] [--power 2000]
+"""
+
+import argparse
+import sys
+import time
+import warnings
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "analysis"))
+import data_utils as du  # noqa: E402
+
+
+def legacy_full_stats_table(data: pd.DataFrame, value_col: str, label: str = ""):
+    """The original one-metric implementation (scipy calls), for comparison."""
+    h, kw_p = du.run_kruskal(data, value_col)
+    pw = du.run_pairwise(data, value_col)
+    rho, sp_p = du.run_dosage_trend(data, value_col)
+
+    rows = [{"Test": "Kruskal-Wallis", "Metric": label, "Statistic": h, "p": kw_p, "Effect_Size": ""}]
+    for r in pw:
+        rows.append({"Test": f"Mann-Whitney ({r['Comparison']})", "Metric": label,
+                      "Statistic": r["U"], "p": r["p"], "Effect_Size": f"r={r['r']:.3f}"})
+    rows.append({"Test": "Spearman dosage", "Metric": label,
+                  "Statistic": rho, "p": sp_p, "Effect_Size": f"rho={rho:.3f}" if not np.isnan(rho) else ""})
+    return pd.DataFrame(rows)
+
+
+def synthetic_donors(n_donors: int, n_metrics: int) -> pd.DataFrame:
+    """Random per-donor metrics; every third metric is integer-valued (ties)."""
+    rng = np.random.default_rng(0)
+    geno = rng.choice(du.GENO_ORDER, n_donors)
+    values = rng.gamma(2, 1, (n_donors, n_metrics)) + 0.2 * (geno == "T/T")[:, None]
+    values[:, ::3] = np.round(values[:, ::3])
+    values[rng.random(values.shape) < 0.05] = np.nan
+    df = pd.DataFrame(values, columns=[f"metric_{i}" for i in range(n_metrics)])
+    df["Genotype"] = pd.Categorical(geno, categories=du.GENO_ORDER, ordered=True)
+    return df
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark batch genotype statistics")
+    parser.add_argument("--donors", type=int, default=27)
+    parser.add_argument("--metrics", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--permutations", type=int, metavar="N",
+                        help="Also benchmark permutation_stats with N resamples")
+    parser.add_argument("--workers", type=int, default=1, help="Threads for permutation_stats")
+    parser.add_argument("--power", type=int, metavar="N",
+                        help="Also check and time simulate_power with N simulations")
+    args = parser.parse_args()
+
+    df = synthetic_donors(args.donors, args.metrics)
+    metrics = [c for c in df.columns if c != "Genotype"]
+    print(f"{args.donors} donors x {len(metrics)} metrics")
+
+    def loop():
+        return pd.concat([legacy_full_stats_table(df, m, label=m) for m in metrics],
+                         ignore_index=True)
+
+    timings = {}
+    for label, fn in [("loop", loop), ("batch", lambda: du.full_stats_tables(df, metrics))]:
+        times = []
+        with warnings.catch_warnings():
+            warnings.simplefilter("ignore")
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                result = fn()
+                times.append(time.perf_counter() - start)
+        timings[label] = (min(times), result)
+
+    (loop_s, expected), (batch_s, result) = timings["loop"], timings["batch"]
+    pd.testing.assert_frame_equal(result, expected, check_exact=False, rtol=1e-9,
+                                  check_dtype=False)
+    print(f"{'engine':>8} {'seconds':>9}")
+    print(f"{'loop':>8} {loop_s:>9.3f}")
+    print(f"{'batch':>8} {batch_s:>9.3f}   ({loop_s / batch_s:.0f}x, tables identical)")
+
+    if args.permutations:
+        bench_permutations(df, metrics, args.permutations, args.workers)
+    if args.power:
+        bench_power(args.power)
+
+
+def bench_permutations(df: pd.DataFrame, metrics: list, n_resamples: int, workers: int) -> None:
+    """Python-loop Spearman permutation test for one metric vs permutation_stats for all."""
+    from scipy.stats import spearmanr
+
+    d = df.dropna(subset=[metrics[0]])
+    dosage = d["Genotype"].cat.codes.to_numpy()
+    values = d[metrics[0]].to_numpy()
+    rng = np.random.default_rng(0)
+    start = time.perf_counter()
+    for _ in range(n_resamples):
+        spearmanr(rng.permutation(dosage), values)
+    loop_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    du.permutation_stats(df[metrics], df["Genotype"], n_resamples=n_resamples, workers=workers)
+    engine_s = time.perf_counter() - start
+    print(f"\n{n_resamples} permutations")
+    print(f"{'loop, 1 test':>24} {loop_s:>9.3f}")
+    print(f"{f'engine, {5 * len(metrics)} tests':>24} {engine_s:>9.3f}")
+
+
+def bench_power(n_sim: int, sizes=(9, 9, 9)) -> None:
+    """scipy equivalence of the simulated p-values, then simulate_power timings."""
+    from scipy.stats import kruskal, mannwhitneyu, spearmanr
+
+    codes = np.repeat(np.arange(len(sizes)), sizes)
+    x = np.random.default_rng(0).standard_normal((len(codes), n_sim)) + 0.5 * codes[:, None]
+    x[:, ::4] = np.round(x[:, ::4])  # ties
+    groups = [x[codes == g] for g in range(len(sizes))]
+    expected = {
+        "mannwhitney": mannwhitneyu(groups[0], groups[1], alternative="two-sided", axis=0).pvalue,
+        "kruskal": kruskal(*groups, axis=0).pvalue,
+        "dosage": np.array([spearmanr(codes, col).pvalue for col in x.T]),
+    }
+    print(f"\nsimulate_power, {n_sim} simulations of {'/'.join(map(str, sizes))}")
+    for test in du.POWER_TESTS:
+        np.testing.assert_allclose(du._simulated_pvalues(x, codes, test), expected[test],
+                                   rtol=1e-9, atol=1e-12)
+        start = time.perf_counter()
+        du.simulate_power([0.2, 0.5, 0.8], sizes, test, n_sim=n_sim)
+        print(f"{test:>12} {time.perf_counter() - start:>9.3f}   (p-values match scipy)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""Throughput benchmark for convert_to_ome_tiff.py: serial vs --workers N.
+
+Synthesizes a directory of single-channel uint16 TIFs (smooth background +
+Poisson noise, so DEFLATE has realistic work to do), converts it with the
+serial path (workers=1) and with each requested worker count, and reports
+MB/s of uncompressed level-0 input.
+
+With --pyramid, instead times the pyramid build alone on one in-memory
+channel of --shape (default 30000 x 40000): the original chained
+downsample_2x against build_pyramid with each kernel, reporting seconds
+and peak extra memory (tracemalloc, excluding the input array).
+
+Usage:
+    python benchmark_convert_to_ome_tiff.py [--channels 8] [--size 8192]
+        [--workers 4 16 64] [--stream]
+    python benchmark_convert_to_ome_tiff.py --pyramid [--shape 30000 40000]
+"""
+
+import argparse
+import contextlib
+import io
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+import numpy as np
+import tifffile
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+from convert_to_ome_tiff import (  # noqa: E402
+    DOWNSAMPLE_KERNELS,
+    NUM_SUBIFDS,
+    build_pyramid,
+    convert,
+    downsample_2x,
+    manifest_path,
+)
+
+
+def make_channels(input_dir: Path, n_channels: int, size: int) -> int:
+    """Write synthetic channels and return their total uncompressed bytes."""
+    rng = np.random.default_rng(0)
+    yy, xx = np.mgrid[0:size, 0:size].astype(np.float32) / size
+    total = 0
+    for c in range(n_channels):
+        base = 500 + 2000 * (np.sin(6 * xx + c) * np.cos(4 * yy - c)) ** 2
+        img = rng.poisson(base).clip(0, 65535).astype(np.uint16)
+        tifffile.imwrite(str(input_dir / f"CH{c:02d}.tif"), img)
+        total += img.nbytes
+    return total
+
+
+def run(input_dir: Path, out_dir: Path, workers: int, stream: bool) -> float:
+    """Convert once and return wall-clock seconds (converter output muted)."""
+    output_path = out_dir / f"bench_w{workers}.ome.tiff"
+    start = time.perf_counter()
+    with contextlib.redirect_stdout(io.StringIO()):
+        convert(input_dir, output_path, 0.5, stream=stream, workers=workers)
+    elapsed = time.perf_counter() - start
+    output_path.unlink()
+    manifest_path(output_path).unlink()
+    return elapsed
+
+
+def legacy_pyramid(img: np.ndarray) -> list[np.ndarray]:
+    """The original float64 block-mean chain, for comparison."""
+    levels = [img]
+    for _ in range(NUM_SUBIFDS):
+        levels.append(downsample_2x(levels[-1]))
+    return levels
+
+
+def bench_pyramid(shape: tuple[int, int]) -> None:
+    """Time and measure peak memory of each pyramid builder on one channel."""
+    rng = np.random.default_rng(0)
+    img = rng.integers(0, 4096, size=shape, dtype=np.uint16)
+    print(f"Pyramid build on {shape[0]}x{shape[1]} uint16 ({img.nbytes / 1e9:.2f} GB)")
+    print(f"{'builder':>16} {'seconds':>9} {'peak MB':>9}")
+
+    builders = {"downsample_2x": legacy_pyramid}
+    for kernel in DOWNSAMPLE_KERNELS:
+        builders[kernel] = lambda a, k=kernel: build_pyramid(a, k)
+
+    for label, build in builders.items():
+        tracemalloc.start()
+        start = time.perf_counter()
+        levels = build(img)
+        elapsed = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        del levels
+        print(f"{label:>16} {elapsed:>9.2f} {peak / 1e6:>9.0f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark OME-TIFF conversion throughput")
+    parser.add_argument("--channels", type=int, default=8)
+    parser.add_argument("--size", type=int, default=8192, help="Square channel edge in pixels")
+    parser.add_argument("--workers", type=int, nargs="+", default=[4, 16, 64])
+    parser.add_argument("--stream", action="store_true", help="Benchmark the --stream path")
+    parser.add_argument("--pyramid", action="store_true",
+                        help="Benchmark pyramid kernels instead of full conversion")
+    parser.add_argument("--shape", type=int, nargs=2, default=[30000, 40000],
+                        metavar=("Y", "X"), help="Channel shape for --pyramid")
+    args = parser.parse_args()
+
+    if args.pyramid:
+        bench_pyramid(tuple(args.shape))
+        return
+
+    with tempfile.TemporaryDirectory() as tmp:
+        tmp = Path(tmp)
+        input_dir = tmp / "in"
+        input_dir.mkdir()
+        nbytes = make_channels(input_dir, args.channels, args.size)
+        mb = nbytes / 1e6
+        print(f"{args.channels} channels x {args.size}x{args.size} uint16 = {mb:.0f} MB"
+              f"{' (stream)' if args.stream else ''}")
+
+        serial = run(input_dir, tmp, 1, args.stream)
+        print(f"{'workers':>8} {'seconds':>9} {'MB/s':>9} {'speedup':>8}")
+        print(f"{1:>8} {serial:>9.2f} {mb / serial:>9.1f} {1.0:>8.2f}")
+        for n in args.workers:
+            t = run(input_dir, tmp, n, args.stream)
+            print(f"{n:>8} {t:>9.2f} {mb / t:>9.1f} {serial / t:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""Import-time benchmark for analysis/data_utils.py.
+
+Times ``import data_utils`` in fresh interpreters (best and median of
+--repeat runs), next to a bare ``import numpy, pandas`` baseline and the
+plotting/SciPy stack data_utils used to import eagerly, then
+lists the slowest top-level imports from ``python -X importtime``. With
+lazy loading, plotting/SciPy/Groups.xlsx work should be absent from the
+list until first use.
+
+Usage:
+    python benchmark_data_utils_import.py [--repeat 5] [--top 10]
+"""
+
+import argparse
+import statistics
+import subprocess
+import sys
+from pathlib import Path
+
+ANALYSIS_DIR = Path(__file__).resolve().parent.parent / "analysis"
+
+EAGER = "import matplotlib.pyplot, seaborn, scipy.stats, scipy.spatial"
+TIMER = "import time; t = time.perf_counter(); {stmt}; print(time.perf_counter() - t)"
+
+
+def time_import(stmt: str, repeat: int) -> list[float]:
+    """Wall-clock seconds of ``stmt`` in ``repeat`` fresh interpreters."""
+    times = []
+    for _ in range(repeat):
+        out = subprocess.run([sys.executable, "-c", TIMER.format(stmt=stmt)],
+                             cwd=ANALYSIS_DIR, capture_output=True, text=True, check=True)
+        times.append(float(out.stdout.strip().splitlines()[-1]))
+    return times
+
+
+def slowest_imports(top: int) -> list[tuple[int, str]]:
+    """(cumulative µs, module) of the slowest top-level imports of data_utils."""
+    out = subprocess.run([sys.executable, "-X", "importtime", "-c", "import data_utils"],
+                         cwd=ANALYSIS_DIR, capture_output=True, text=True, check=True)
+    rows = []
+    for line in out.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = (part.strip() for part in line[len("import time:"):].split("|"))
+        # Top-level entries are not indented
+        if not name.startswith(" "):
+            rows.append((int(cumulative), name))
+    return sorted(rows, reverse=True)[:top]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark `import data_utils`")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--top", type=int, default=10)
+    args = parser.parse_args()
+
+    print(f"{'statement':>28} {'best s':>8} {'median s':>9}")
+    statements = {"numpy + pandas": "import numpy, pandas",
+                  "plotting + SciPy (eager)": EAGER,
+                  "data_utils": "import data_utils"}
+    for label, stmt in statements.items():
+        times = time_import(stmt, args.repeat)
+        print(f"{label:>28} {min(times):>8.3f} {statistics.median(times):>9.3f}")
+
+    print("\nSlowest top-level imports (cumulative ms):")
+    for cumulative, name in slowest_imports(args.top):
+        print(f"{cumulative / 1000:>10.1f}  {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,153 @@
+#!/usr/bin/env python3
+"""Timing benchmark for data_utils.build_feature_matrix.
+
+Times the single-pass build_feature_matrix against the original
+implementation (compute_density + get_regions/get_vessels + separate
+groupby passes, reproduced below) on the combined Phenocycler + CODEX frame
+from load_all_data(), and checks that both return the same columns, index
+and values.
+
+With --synthetic N, uses N random annotation rows instead, for machines
+without Measurements/.
+
+Usage:
+    python benchmark_feature_matrix.py [--repeat 5] [--synthetic 500000]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "analysis"))
+import data_utils as du  # noqa: E402
+
+
+def legacy_build_feature_matrix(df: pd.DataFrame) -> pd.DataFrame:
+    """The original multi-pass implementation, for comparison."""
+    density = du.compute_density(df)
+    regions = du.get_regions(df)
+
+    features = {}
+    for region in du.MAIN_REGIONS:
+        rd = density[density["Region"] == region]
+        features[f"{region}_density"] = rd.set_index("Sample")["Density_per_mm2"]
+        if region != "RedPulp":
+            features[f"{region}_norm_density"] = rd.set_index("Sample")["Density_Normalized"]
+
+    follicles = regions[regions["Classification"] == "Follicle"]
+    fol_per_img = follicles.groupby(["Sample"], observed=True).agg(
+        Follicle_count=("Object ID", "count"),
+        Follicle_total_area=("Area µm^2", "sum"),
+        Follicle_mean_area=("Area µm^2", "mean"),
+    )
+    for col in fol_per_img.columns:
+        features[col] = fol_per_img[col]
+
+    total_area = regions[regions["Classification"].isin(du.MAIN_REGIONS)].groupby(
+        "Sample", observed=True)["Area µm^2"].sum()
+    fol_area = follicles.groupby("Sample", observed=True)["Area µm^2"].sum()
+    features["Follicle_fraction"] = fol_area / total_area
+
+    region_areas = (
+        regions[regions["Classification"].isin(du.MAIN_REGIONS)]
+        .groupby(["Sample", "Classification"], observed=True)["Area µm^2"]
+        .sum()
+        .unstack(fill_value=0)
+    )
+    region_total = region_areas.sum(axis=1)
+    for r in du.MAIN_REGIONS:
+        if r in region_areas.columns:
+            features[f"{r}_fraction"] = region_areas[r] / region_total
+
+    wp_area = pd.Series(0.0, index=region_total.index)
+    for r in ["Follicle", "PALS"]:
+        if r in region_areas.columns:
+            wp_area = wp_area + region_areas[r]
+    features["WP_fraction"] = wp_area / region_total
+    if "Follicle" in region_areas.columns and "PALS" in region_areas.columns:
+        features["Follicle_PALS_ratio"] = region_areas["Follicle"] / region_areas["PALS"].replace(0, np.nan)
+
+    sv = df[df["Classification"] == "SmallVessel"].copy()
+    if not sv.empty:
+        sv["Elongation"] = sv["Max diameter µm"] / sv["Min diameter µm"].replace(0, np.nan)
+        morph_agg = sv.groupby("Sample", observed=True).agg(
+            Vessel_median_area=("Area µm^2", "median"),
+            Vessel_median_circularity=("Circularity", "median"),
+            Vessel_median_solidity=("Solidity", "median"),
+            Vessel_median_elongation=("Elongation", "median"),
+        )
+        for col in morph_agg.columns:
+            features[col] = morph_agg[col]
+
+    feat_df = pd.DataFrame(features)
+    feat_df.index.name = "Sample"
+    sample_meta = df.drop_duplicates("Sample").set_index("Sample")[["Genotype"]]
+    feat_df = feat_df.join(sample_meta)
+    feat_df["Platform"] = feat_df.index.map(
+        lambda s: "CODEX" if s in du.CODEX_SAMPLES else "Phenocycler")
+    return feat_df
+
+
+def synthetic_annotations(n_rows: int) -> pd.DataFrame:
+    """Random annotation rows, one image per genotyped sample."""
+    rng = np.random.default_rng(0)
+    samples = sorted(du.PHENOCYCLER_SAMPLES | du.CODEX_SAMPLES)
+    sample = rng.choice(samples, n_rows)
+    classes = du.MAIN_REGIONS + ["LargeVessel", "SmallVessel", "SmallVessel", "SmallVessel"]
+    df = pd.DataFrame({
+        "Image": pd.Series(sample).str.cat(["_img.ome.tiff"] * n_rows),
+        "Object ID": np.arange(n_rows).astype(str),
+        "Classification": rng.choice(classes, n_rows),
+        "Parent": pd.Series(rng.choice(du.MAIN_REGIONS, n_rows)).radd("Annotation (") + ")",
+        "Area µm^2": rng.gamma(2, 5000, n_rows),
+        "Max diameter µm": rng.gamma(3, 10, n_rows),
+        "Min diameter µm": rng.gamma(2, 5, n_rows),
+        "Circularity": rng.random(n_rows),
+        "Solidity": rng.random(n_rows),
+    })
+    meta = du.sample_metadata(df["Image"])
+    df["Sample"] = meta["Sample"]
+    df["Genotype"] = meta["Genotype"]
+    # Same layout and dtypes as the load_all_data() Parquet cache
+    df["Region"] = df["Parent"].str.extract(r"Annotation \((\w+)\)", expand=False)
+    for col in ["Image", "Classification", "Region"]:
+        df[col] = df[col].astype("category")
+    return df.dropna(subset=["Genotype"]).reset_index(drop=True)
+
+
+def best_of(fn, df: pd.DataFrame, repeat: int) -> tuple[float, pd.DataFrame]:
+    """Fastest of ``repeat`` runs and the last result."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn(df)
+        times.append(time.perf_counter() - start)
+    return min(times), result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark build_feature_matrix")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--synthetic", type=int, metavar="N",
+                        help="Use N synthetic rows instead of load_all_data()")
+    args = parser.parse_args()
+
+    df = synthetic_annotations(args.synthetic) if args.synthetic else du.load_all_data()
+    print(f"{len(df):,} annotation rows, {df['Sample'].nunique()} samples")
+
+    legacy_s, expected = best_of(legacy_build_feature_matrix, df, args.repeat)
+    new_s, result = best_of(du.build_feature_matrix, df, args.repeat)
+    pd.testing.assert_frame_equal(result, expected, check_exact=True,
+                                  check_dtype=False, check_index_type=False)
+    print(f"{'builder':>10} {'seconds':>9}")
+    print(f"{'legacy':>10} {legacy_s:>9.3f}")
+    print(f"{'single':>10} {new_s:>9.3f}   ({legacy_s / new_s:.1f}x, "
+          f"{result.shape[1] - 2} features identical)")
+
+
+if __name__ == "__main__":
+    main()
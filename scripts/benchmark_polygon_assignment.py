@@ -0,0 +1,103 @@
+#!/usr/bin/env python3
+"""Timing benchmark for data_utils.assign_objects_to_polygons.
+
+Scatters N random cell centroids over a synthetic 20 x 20 mm section with
+non-overlapping contour-like Follicle and PALS polygons (~100 vertices
+each, as extract_region_polygons produces) and times the vectorized
+assign_objects_to_polygons against the original implementation (one
+shapely Point per cell, Python loop over the query pairs, reproduced
+below). Labels are checked to be identical wherever the original runs.
+
+The original is only timed up to --legacy-max points; the H14 Cells.csv
+workload is 22.6M cells.
+
+Usage:
+    python benchmark_polygon_assignment.py [--sizes 1000000 10000000 22600000]
+        [--workers 4] [--legacy-max 1000000]
+"""
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+import numpy as np
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "analysis"))
+import data_utils as du  # noqa: E402
+
+
+def legacy_assign_objects_to_polygons(coords, polygon_dict):
+    """The original Point-per-object implementation, for comparison."""
+    from shapely import STRtree
+    from shapely.geometry import Point
+
+    labels = np.full(len(coords), "Unassigned", dtype=object)
+    all_polys, poly_labels = [], []
+    for region, polys in polygon_dict.items():
+        for p in polys:
+            all_polys.append(p)
+            poly_labels.append(region)
+    if not all_polys:
+        return labels
+    tree = STRtree(all_polys)
+    points = np.array([Point(x, y) for x, y in coords], dtype=object)
+    pt_idx, tree_idx = tree.query(points, predicate="within")
+    for pi, ti in zip(pt_idx, tree_idx):
+        labels[pi] = poly_labels[ti]
+    return labels
+
+
+def synthetic_regions(extent: float = 20000, spacing: float = 1000) -> dict:
+    """Star-shaped Follicle polygons on a jittered grid, PALS crescents beside them."""
+    from shapely.geometry import Polygon
+
+    rng = np.random.default_rng(0)
+    angles = np.linspace(0, 2 * np.pi, 100, endpoint=False)
+    regions = {"Follicle": [], "PALS": []}
+    for cx in np.arange(spacing / 2, extent, spacing):
+        for cy in np.arange(spacing / 2, extent, spacing):
+            if rng.random() < 0.4:
+                continue
+            radius = rng.uniform(150, 300) * (1 + 0.15 * np.sin(rng.integers(3, 7) * angles))
+            regions["Follicle"].append(Polygon(np.c_[cx + radius * np.cos(angles),
+                                                     cy + radius * np.sin(angles)]))
+            outer = rng.uniform(390, 450)
+            arc = angles[:50]
+            ring = np.r_[np.c_[cx + outer * np.cos(arc), cy + outer * np.sin(arc)],
+                         np.c_[cx + 360 * np.cos(arc[::-1]), cy + 360 * np.sin(arc[::-1])]]
+            regions["PALS"].append(Polygon(ring))
+    return regions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark assign_objects_to_polygons")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1_000_000, 10_000_000, 22_600_000])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--legacy-max", type=int, default=1_000_000,
+                        help="Largest N to also run the original implementation on")
+    args = parser.parse_args()
+
+    regions = synthetic_regions()
+    print(f"{len(regions['Follicle'])} Follicle + {len(regions['PALS'])} PALS polygons")
+    print(f"{'points':>12} {'legacy s':>9} {'1 thread s':>11} {f'{args.workers} threads s':>12}")
+    rng = np.random.default_rng(1)
+    for n in args.sizes:
+        coords = rng.random((n, 2)) * 20000
+        legacy = "-"
+        if n <= args.legacy_max:
+            start = time.perf_counter()
+            expected = legacy_assign_objects_to_polygons(coords, regions)
+            legacy = f"{time.perf_counter() - start:.2f}"
+        timings = []
+        for workers in (1, args.workers):
+            start = time.perf_counter()
+            labels = du.assign_objects_to_polygons(coords, regions, workers=workers)
+            timings.append(time.perf_counter() - start)
+        if n <= args.legacy_max:
+            assert (labels == expected).all(), "labels differ from the original implementation"
+        print(f"{n:>12,} {legacy:>9} {timings[0]:>11.2f} {timings[1]:>12.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -7,12 +7,47 @@ Produces a Bio-Formats/QuPath-compatible file:
 - CYX axis order (one IFD page per channel)
 - Manual OME-XML with per-channel TiffData blocks for correct channel mapping
 
+With --stream, each channel is read as memory-mapped row bands and written
+tile by tile; the SubIFD levels are built from the same pass via temporary
+on-disk buffers, so peak memory scales with one tile row rather than the
+whole slide.
+
+With --workers N (N > 1), tiles are DEFLATE-compressed on N threads and the next
+channel is read/downsampled in the background while the current one is
+written. IFDs are still written one channel at a time in CYX order.
+
+A sidecar manifest (<output_path>.manifest.json) records a CRC32 of every
+tile at every level of every channel and is checkpointed after each channel.
+--resume truncates the file back to the last finished channel and appends
+the rest; --verify re-reads every tile in parallel and checks it against
+the manifest without needing QuPath.
+
+Pyramid levels are built with integer kernels (no float temporaries):
+"mean" (default, identical to the original block mean), "max" (keeps
+sparse bright markers visible at low zoom) or "nearest" (label images).
+Use --kernel for all channels and --channel-kernel NAME=KERNEL to override.
+
+If <output_path> ends in .zarr, an OME-Zarr (NGFF 0.4) multiscale store is
+written instead: arrays 0-5 of shape (C, Y, X) in independently readable
+(1, 512, 512) chunks, with the same channel names and pixel size as the
+OME-XML. Requires the zarr package (>= 3).
+
 Usage:
     python convert_to_ome_tiff.py <input_dir> <output_path> [--pixel-size 0.508]
+        [--stream] [--workers N] [--resume] [--kernel mean|max|nearest]
+        [--channel-kernel CD31=max ...]
+    python convert_to_ome_tiff.py <input_dir> <output>.ome.zarr [--pixel-size 0.508]
+    python convert_to_ome_tiff.py --verify <output_path> [--workers N]
 """
 
 import argparse
+import json
+import os
+import struct
 import sys
+import tempfile
+import zlib
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from uuid import uuid4
 
@@ -21,6 +56,7 @@ import tifffile
 
 
 NUM_SUBIFDS = 5  # 2x, 4x, 8x, 16x, 32x
+TILE_SIZE = 512
 
 
 def discover_channels(input_dir: Path) -> list[Path]:
@@ -46,6 +82,12 @@ def channel_name(path: Path) -> str:
     return name
 
 
+def channel_shape(path: Path) -> tuple[int, int]:
+    """Return the (Y, X) shape of a single-channel TIF without reading pixels."""
+    with tifffile.TiffFile(str(path)) as tf:
+        return tuple(tf.pages[0].shape[-2:])
+
+
 def downsample_2x(img: np.ndarray) -> np.ndarray:
     """Block-mean 2x downsample of a 2D (Y, X) array, trimming odd dims."""
     h, w = img.shape
@@ -53,6 +95,299 @@ def downsample_2x(img: np.ndarray) -> np.ndarray:
     return img[:h2, :w2].reshape(h2 // 2, 2, w2 // 2, 2).mean(axis=(1, 3)).astype(np.uint16)
 
 
+# ---------------------------------------------------------------------------
+# Integer 2x downsampling kernels
+# ---------------------------------------------------------------------------
+# Each kernel reduces an even-sized (2h, 2w) uint16 array into ``out`` (h, w).
+def _mean_2x(img: np.ndarray, out: np.ndarray) -> None:
+    """Truncating 2x2 block mean via uint32 accumulation (== downsample_2x)."""
+    acc = np.add(img[0::2, 0::2], img[1::2, 0::2], dtype=np.uint32)
+    acc += img[0::2, 1::2]
+    acc += img[1::2, 1::2]
+    acc >>= 2
+    out[...] = acc
+
+
+def _max_2x(img: np.ndarray, out: np.ndarray) -> None:
+    """2x2 block maximum, for sparse markers that a mean would wash out."""
+    np.maximum(img[0::2, 0::2], img[1::2, 0::2], out=out)
+    np.maximum(out, img[0::2, 1::2], out=out)
+    np.maximum(out, img[1::2, 1::2], out=out)
+
+
+def _nearest_2x(img: np.ndarray, out: np.ndarray) -> None:
+    """Top-left sample of each 2x2 block, for label images."""
+    out[...] = img[0::2, 0::2]
+
+
+DOWNSAMPLE_KERNELS = {
+    "mean": _mean_2x,
+    "max": _max_2x,
+    "nearest": _nearest_2x,
+}
+
+
+def downsample(img: np.ndarray, kernel: str = "mean", band_rows: int = 2048) -> np.ndarray:
+    """2x downsample a 2D uint16 array with a named kernel, trimming odd dims.
+
+    Works in bands of ``band_rows`` output rows so kernel temporaries stay
+    small regardless of image size.
+    """
+    func = DOWNSAMPLE_KERNELS[kernel]
+    h, w = img.shape[0] // 2, img.shape[1] // 2
+    out = np.empty((h, w), dtype=np.uint16)
+    for y in range(0, h, band_rows):
+        y1 = min(y + band_rows, h)
+        func(img[2 * y:2 * y1, :2 * w], out[y:y1])
+    return out
+
+
+def build_pyramid(img: np.ndarray, kernel: str = "mean") -> list[np.ndarray]:
+    """Return [1x, 2x, 4x, 8x, 16x, 32x] levels of a 2D uint16 array.
+
+    The full-resolution image is read exactly once; every further level is
+    reduced from the (4x smaller) level above it.
+    """
+    levels = [img]
+    for _ in range(NUM_SUBIFDS):
+        levels.append(downsample(levels[-1], kernel))
+    return levels
+
+
+def load_pyramid(path: Path, kernel: str = "mean") -> list[np.ndarray]:
+    """Load one channel as uint16 and return [1x, 2x, 4x, 8x, 16x, 32x] levels."""
+    return build_pyramid(tifffile.imread(str(path)).astype(np.uint16, copy=False), kernel)
+
+
+# ---------------------------------------------------------------------------
+# Streaming (tile-at-a-time) writer
+# ---------------------------------------------------------------------------
+def open_channel(path: Path):
+    """Open a single-channel TIF for row-band reads without loading it whole.
+
+    Uncompressed contiguous files are memory-mapped directly; anything else
+    (compressed strips/tiles) is read lazily through tifffile's zarr store.
+    """
+    try:
+        return tifffile.memmap(str(path), mode="r")
+    except ValueError:
+        import zarr
+
+        store = tifffile.imread(str(path), aszarr=True)
+        return zarr.open(store, mode="r")
+
+
+def pyramid_shapes(size_y: int, size_x: int) -> list[tuple[int, int]]:
+    """Shapes of level 0 plus each SubIFD level, matching repeated downsampling."""
+    shapes = [(size_y, size_x)]
+    for _ in range(NUM_SUBIFDS):
+        h, w = shapes[-1]
+        shapes.append((h // 2, w // 2))
+    return shapes
+
+
+def iter_tiles(band: np.ndarray, tile: int = TILE_SIZE):
+    """Yield (tile, tile) pieces of a row band left to right (edges may be short)."""
+    for x in range(0, band.shape[1], tile):
+        yield np.ascontiguousarray(band[:, x:x + tile])
+
+
+def iter_level_tiles(img: np.ndarray, tile: int = TILE_SIZE):
+    """Yield tiles of a 2D array in TIFF (row-major) tile order."""
+    for y in range(0, img.shape[0], tile):
+        yield from iter_tiles(img[y:y + tile], tile)
+
+
+def iter_base_tiles(
+    src,
+    levels: list[np.ndarray],
+    kernel: str = "mean",
+    tile: int = TILE_SIZE,
+):
+    """Yield level-0 tiles from ``src`` and fill the SubIFD ``levels`` as a side effect.
+
+    Bands are ``tile`` rows tall (a multiple of 2**NUM_SUBIFDS), so each band
+    downsamples to whole rows at every level and the result is identical to
+    downsampling the full image.
+    """
+    for y in range(0, src.shape[0], tile):
+        band = np.asarray(src[y:y + tile]).astype(np.uint16, copy=False)
+
+        # Downsample before yielding: the writer stops pulling once it has
+        # every level-0 tile, so work after the last yield would never run.
+        sub = band
+        for k, level in enumerate(levels, 1):
+            sub = downsample(sub, kernel)
+            y_k = y >> k
+            level[y_k:y_k + sub.shape[0]] = sub
+        del sub
+
+        yield from iter_tiles(band, tile)
+
+
+def write_channel_streaming(
+    tw: tifffile.TiffWriter,
+    path: Path,
+    page_kwargs: dict,
+    subifd_options: dict,
+    tmp_dir: Path,
+    checksums: list[list[int]],
+    kernel: str = "mean",
+) -> None:
+    """Write one channel (level 0 + SubIFDs) without holding it in memory.
+
+    Per-level tile CRCs are appended to ``checksums``.
+    """
+    src = open_channel(path)
+    shapes = pyramid_shapes(*src.shape)
+
+    # SubIFD levels are buffered on disk until level 0 is complete, because
+    # TIFF requires the full-resolution tiles to be written first.
+    levels = [
+        np.lib.format.open_memmap(
+            tmp_dir / f"level{k}.npy", mode="w+", dtype=np.uint16, shape=shape)
+        for k, shape in enumerate(shapes[1:], 1)
+    ]
+
+    tw.write(
+        record_tiles(iter_base_tiles(src, levels, kernel), checksums),
+        shape=shapes[0],
+        dtype=np.uint16,
+        **page_kwargs,
+    )
+    del src
+
+    for level, shape in zip(levels, shapes[1:]):
+        level.flush()
+        tw.write(record_tiles(iter_level_tiles(level), checksums),
+                 shape=shape, dtype=np.uint16, **subifd_options)
+    del levels
+
+
+# ---------------------------------------------------------------------------
+# Integrity manifest, checkpointing and verification
+# ---------------------------------------------------------------------------
+def manifest_path(output_path: Path) -> Path:
+    """Sidecar manifest path for an output OME-TIFF."""
+    return output_path.with_name(output_path.name + ".manifest.json")
+
+
+def tile_crc(tile: np.ndarray, tile_size: int = TILE_SIZE) -> int:
+    """CRC32 of a tile as stored: native uint16, zero-padded to full tile size."""
+    tile = np.ascontiguousarray(tile, dtype=np.uint16)
+    if tile.shape != (tile_size, tile_size):
+        tile = np.pad(tile, ((0, tile_size - tile.shape[0]), (0, tile_size - tile.shape[1])))
+    return zlib.crc32(tile)
+
+
+def record_tiles(tiles, checksums: list[list[int]]):
+    """Pass tiles through unchanged, collecting their CRCs as a new level."""
+    crcs = []
+    checksums.append(crcs)
+    for tile in tiles:
+        crcs.append(tile_crc(tile))
+        yield tile
+
+
+def source_stamp(path: Path) -> dict:
+    """Identify a source channel file by name, size and mtime."""
+    st = path.stat()
+    return {"source": path.name, "size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def write_manifest(path: Path, manifest: dict) -> None:
+    """Atomically replace the manifest so a crash never leaves it half-written."""
+    tmp = path.with_name(path.name + ".tmp")
+    tmp.write_text(json.dumps(manifest))
+    os.replace(tmp, path)
+
+
+def finished_channels(manifest: dict, settings: dict, channel_paths: list[Path]) -> int:
+    """Number of leading channels in ``manifest`` that are safe to keep on resume."""
+    if manifest.get("settings") != settings:
+        return 0
+    n_done = 0
+    for entry, path in zip(manifest["channels"], channel_paths):
+        if entry["stamp"] != source_stamp(path):
+            break
+        n_done += 1
+    return n_done
+
+
+def truncate_to_checkpoint(output_path: Path, n_pages: int, end_offset: int) -> None:
+    """Cut a big-endian BigTIFF back to its first ``n_pages`` top-level IFDs.
+
+    Drops everything after ``end_offset`` and clears the last kept IFD's
+    next-IFD pointer, which may point into the partially written channel.
+    """
+    with open(output_path, "r+b") as fh:
+        fh.truncate(end_offset)
+        fh.seek(8)
+        (offset,) = struct.unpack(">Q", fh.read(8))
+        for _ in range(n_pages):
+            fh.seek(offset)
+            (n_tags,) = struct.unpack(">Q", fh.read(8))
+            next_ptr = offset + 8 + 20 * n_tags
+            fh.seek(next_ptr)
+            (offset,) = struct.unpack(">Q", fh.read(8))
+        fh.seek(next_ptr)
+        fh.write(struct.pack(">Q", 0))
+
+
+def verify_channel(output_path: Path, c: int, expected: list[list[int]]) -> list[str]:
+    """Decode every tile of channel ``c`` and return a list of mismatches."""
+    errors = []
+    with tifffile.TiffFile(str(output_path)) as tif:
+        series = tif.series[0]
+        if len(series.levels) != len(expected):
+            return [f"channel {c}: {len(series.levels)} levels, expected {len(expected)}"]
+        for level, (lvl, crcs) in enumerate(zip(series.levels, expected)):
+            page = lvl.pages[c]
+            tiles = list(zip(page.dataoffsets, page.databytecounts))
+            if len(tiles) != len(crcs):
+                errors.append(f"channel {c} level {level}: {len(tiles)} tiles, expected {len(crcs)}")
+            for t, ((offset, bytecount), crc) in enumerate(zip(tiles, crcs)):
+                tif.filehandle.seek(offset)
+                data = tif.filehandle.read(bytecount)
+                # Decode tile by tile so one corrupt tile does not hide the rest
+                try:
+                    tile, _, _ = page.keyframe.decode(data, t)
+                except Exception as e:
+                    errors.append(f"channel {c} level {level} tile {t}: decode failed ({e})")
+                    continue
+                if tile is None or tile_crc(tile[0, :, :, 0]) != crc:
+                    errors.append(f"channel {c} level {level} tile {t}: checksum mismatch")
+    return errors
+
+
+def verify(output_path: Path, workers: int | None = None) -> bool:
+    """Check every tile of ``output_path`` against its manifest, channels in parallel."""
+    manifest = json.loads(manifest_path(output_path).read_text())
+    channels = manifest["channels"]
+    print(f"Verifying {output_path} ({len(channels)} channels) ...")
+
+    with tifffile.TiffFile(str(output_path)) as tif:
+        n_pages = tif.series[0].shape[0]
+    errors = []
+    if n_pages != len(manifest["names"]):
+        errors.append(f"{n_pages} channels in file, expected {len(manifest['names'])}")
+
+    with ThreadPoolExecutor(max_workers=workers or os.cpu_count()) as pool:
+        results = pool.map(
+            lambda c: verify_channel(output_path, c, channels[c]["checksums"]),
+            range(min(n_pages, len(channels))),
+        )
+        for entry, errs in zip(channels, results):
+            status = "OK" if not errs else f"{len(errs)} bad"
+            print(f"  {entry['name']}: {status}")
+            errors.extend(errs)
+
+    for e in errors:
+        print(f"  ERROR: {e}")
+    print("Verification passed" if not errors else f"Verification FAILED ({len(errors)} errors)")
+    return not errors
+
+
 def build_ome_xml(
     names: list[str],
     size_y: int,
@@ -110,24 +445,174 @@ def build_ome_xml(
     return ome_xml.encode('utf-8')
 
 
-def convert(input_dir: Path, output_path: Path, pixel_size: float) -> None:
-    """Convert single-channel TIFs to pyramidal OME-TIFF."""
+def resolve_kernels(
+    names: list[str],
+    kernel: str,
+    channel_kernels: dict[str, str] | None,
+) -> list[str]:
+    """Per-channel downsampling kernel names, applying any overrides."""
+    channel_kernels = channel_kernels or {}
+    unknown = set(channel_kernels) - set(names)
+    if unknown:
+        sys.exit(f"--channel-kernel names not found: {', '.join(sorted(unknown))}")
+    return [channel_kernels.get(name, kernel) for name in names]
+
+
+# ---------------------------------------------------------------------------
+# OME-Zarr (NGFF) output
+# ---------------------------------------------------------------------------
+def build_ngff_attrs(names: list[str], pixel_size: float, filename: str) -> dict:
+    """NGFF 0.4 ``multiscales`` + ``omero`` attributes mirroring build_ome_xml."""
+    datasets = [
+        {
+            "path": str(k),
+            "coordinateTransformations": [
+                {"type": "scale", "scale": [1.0, pixel_size * 2**k, pixel_size * 2**k]}
+            ],
+        }
+        for k in range(NUM_SUBIFDS + 1)
+    ]
+    return {
+        "multiscales": [{
+            "version": "0.4",
+            "name": filename,
+            "axes": [
+                {"name": "c", "type": "channel"},
+                {"name": "y", "type": "space", "unit": "micrometer"},
+                {"name": "x", "type": "space", "unit": "micrometer"},
+            ],
+            "datasets": datasets,
+        }],
+        "omero": {
+            "version": "0.4",
+            "name": filename,
+            "channels": [
+                {"label": name, "active": True, "color": "FFFFFF",
+                 "window": {"start": 0, "end": 65535, "min": 0, "max": 65535}}
+                for name in names
+            ],
+        },
+    }
+
+
+def convert_zarr(
+    input_dir: Path,
+    output_path: Path,
+    pixel_size: float,
+    kernel: str = "mean",
+    channel_kernels: dict[str, str] | None = None,
+) -> None:
+    """Convert single-channel TIFs to a multiscale OME-Zarr store.
+
+    Channels are always streamed in row bands: level 0 is written chunk-row
+    by chunk-row and each band is downsampled straight into levels 1-5.
+    """
+    import zarr
+
+    channel_paths = discover_channels(input_dir)
+    names = [channel_name(p) for p in channel_paths]
+    n_channels = len(names)
+    kernels = resolve_kernels(names, kernel, channel_kernels)
+    print(f"Found {n_channels} channels: {', '.join(names)}")
+
+    size_y, size_x = channel_shape(channel_paths[0])
+    print(f"Image dimensions: {size_y} x {size_x}")
+    shapes = pyramid_shapes(size_y, size_x)
+
+    print(f"Writing {output_path} ...")
+    root = zarr.open_group(str(output_path), mode="w", zarr_format=2)
+    arrays = [
+        root.create_array(
+            str(k),
+            shape=(n_channels, *shape),
+            chunks=(1, TILE_SIZE, TILE_SIZE),
+            dtype=np.uint16,
+            fill_value=0,
+            chunk_key_encoding={"name": "v2", "separator": "/"},
+        )
+        for k, shape in enumerate(shapes)
+    ]
+    root.attrs.update(build_ngff_attrs(names, pixel_size, output_path.name))
+
+    for c, (path, name) in enumerate(zip(channel_paths, names)):
+        print(f"  [{c + 1}/{n_channels}] {name}")
+        src = open_channel(path)
+        if src.shape != (size_y, size_x):
+            sys.exit(f"{path.name}: shape {src.shape} != {(size_y, size_x)}")
+        for y in range(0, size_y, TILE_SIZE):
+            band = np.asarray(src[y:y + TILE_SIZE]).astype(np.uint16, copy=False)
+            arrays[0][c, y:y + band.shape[0]] = band
+            for k, arr in enumerate(arrays[1:], 1):
+                band = downsample(band, kernels[c])
+                y_k = y >> k
+                arr[c, y_k:y_k + band.shape[0]] = band
+        del src
+
+    size = sum(f.stat().st_size for f in output_path.rglob("*") if f.is_file())
+    print(f"Wrote {output_path} ({size / 1e9:.2f} GB)")
+
+
+def convert(
+    input_dir: Path,
+    output_path: Path,
+    pixel_size: float,
+    stream: bool = False,
+    workers: int | None = None,
+    resume: bool = False,
+    kernel: str = "mean",
+    channel_kernels: dict[str, str] | None = None,
+) -> None:
+    """Convert single-channel TIFs to pyramidal OME-TIFF.
+
+    If ``stream`` is True, channels are written tile by tile from
+    memory-mapped sources instead of being loaded whole.
+
+    ``workers`` is the number of tile-compression threads (None lets
+    tifffile choose; 1 is fully serial). With more than one worker the
+    next channel's pyramid is prepared while the current one is written.
+
+    If ``resume`` is True and a manifest from an interrupted run matches the
+    current sources and settings, finished channels are kept and the
+    conversion continues from the first unfinished one.
+
+    ``kernel`` names the pyramid downsampling kernel (see
+    DOWNSAMPLE_KERNELS); ``channel_kernels`` overrides it per channel name.
+    """
     channel_paths = discover_channels(input_dir)
     names = [channel_name(p) for p in channel_paths]
     n_channels = len(names)
 
     print(f"Found {n_channels} channels: {', '.join(names)}")
 
-    # Read first channel to get dimensions
-    first = tifffile.imread(str(channel_paths[0]))
-    size_y, size_x = first.shape
-    del first
+    kernels = resolve_kernels(names, kernel, channel_kernels)
+
+    # Read dimensions from the first channel's header
+    size_y, size_x = channel_shape(channel_paths[0])
     print(f"Image dimensions: {size_y} x {size_x}")
 
     # Build OME-XML
     filename = output_path.name
     ome_xml = build_ome_xml(names, size_y, size_x, pixel_size, filename)
 
+    # Manifest: resume from the last checkpoint or start fresh
+    settings = {"names": names, "shape": [size_y, size_x],
+                "pixel_size": pixel_size, "tile": TILE_SIZE, "kernels": kernels}
+    mpath = manifest_path(output_path)
+    manifest = {"output": filename, "settings": settings, "names": names,
+                "checksum": "crc32", "channels": []}
+    start = 0
+    if resume and mpath.exists() and output_path.exists():
+        previous = json.loads(mpath.read_text())
+        start = finished_channels(previous, settings, channel_paths)
+        if start > 0:
+            manifest["channels"] = previous["channels"][:start]
+            truncate_to_checkpoint(output_path, start, manifest["channels"][-1]["end_offset"])
+    if start == n_channels:
+        print(f"All {n_channels} channels already converted; nothing to resume")
+        return
+    if start > 0:
+        print(f"Resuming after {start} finished channels")
+
     # Resolution in pixels per centimeter (matching Bio-Formats convention)
     resolution_ppcm = 1e4 / pixel_size  # µm/pixel → pixels/cm
     resolution = (resolution_ppcm, resolution_ppcm)
@@ -136,41 +621,73 @@ def convert(input_dir: Path, output_path: Path, pixel_size: float) -> None:
     compress = tifffile.COMPRESSION.ADOBE_DEFLATE
 
     subifd_options = dict(
-        tile=(512, 512),
+        tile=(TILE_SIZE, TILE_SIZE),
         compression=compress,
         subfiletype=1,
         metadata=None,
+        maxworkers=workers,
     )
+    # Read + downsample channel i+1 while channel i is compressed and written
+    # (opt-in: holds two channels' pyramids in memory at once)
+    prefetch = not stream and workers is not None and workers > 1
+    # OME files are not appendable by default; the checkpoint makes it safe
+    writer_kwargs = dict(append="force") if start > 0 else dict(bigtiff=True, byteorder=">")
 
     print(f"Writing {output_path} ...")
-    with tifffile.TiffWriter(str(output_path), bigtiff=True, byteorder=">") as tw:
-        for i, (path, name) in enumerate(zip(channel_paths, names)):
+    with tifffile.TiffWriter(str(output_path), **writer_kwargs) as tw, \
+            tempfile.TemporaryDirectory(dir=output_path.parent) as tmp, \
+            ThreadPoolExecutor(max_workers=1) as reader:
+        pending = (reader.submit(load_pyramid, channel_paths[start], kernels[start])
+                   if prefetch else None)
+        for i in range(start, n_channels):
+            path, name = channel_paths[i], names[i]
             print(f"  [{i + 1}/{n_channels}] {name}")
 
-            # Load single 2D channel
-            img = tifffile.imread(str(path)).astype(np.uint16)
-
-            # Write full-resolution page
             page_kwargs = dict(
-                tile=(512, 512),
+                tile=(TILE_SIZE, TILE_SIZE),
                 compression=compress,
                 subifds=NUM_SUBIFDS,
                 metadata=None,
                 resolution=resolution,
                 resolutionunit=3,  # CENTIMETER
                 software="OME Bio-Formats 8.2.0",
+                maxworkers=workers,
             )
             if i == 0:
                 page_kwargs["description"] = ome_xml
-            tw.write(img, **page_kwargs)
 
-            # Write 5 SubIFD pyramid levels (2x, 4x, 8x, 16x, 32x)
-            sub = img
-            del img
-            for _ in range(NUM_SUBIFDS):
-                sub = downsample_2x(sub)
-                tw.write(sub, **subifd_options)
-            del sub
+            checksums: list[list[int]] = []
+            if stream:
+                write_channel_streaming(tw, path, page_kwargs, subifd_options,
+                                        Path(tmp), checksums, kernels[i])
+            else:
+                # Load single 2D channel and its 5 downsampled levels
+                if prefetch:
+                    levels = pending.result()
+                    if i + 1 < n_channels:
+                        pending = reader.submit(load_pyramid, channel_paths[i + 1],
+                                                kernels[i + 1])
+                else:
+                    levels = load_pyramid(path, kernels[i])
+
+                # Write full-resolution page, then 5 SubIFD pyramid levels
+                # (2x, 4x, 8x, 16x, 32x)
+                for level, sub in enumerate(levels):
+                    tw.write(record_tiles(iter_level_tiles(sub), checksums),
+                             shape=sub.shape, dtype=np.uint16,
+                             **(page_kwargs if level == 0 else subifd_options))
+                del levels
+
+            # Checkpoint: channel data is on disk before the manifest says so
+            tw.filehandle.flush()
+            manifest["channels"].append({
+                "index": i,
+                "name": name,
+                "stamp": source_stamp(path),
+                "end_offset": tw.filehandle.tell(),
+                "checksums": checksums,
+            })
+            write_manifest(mpath, manifest)
 
     print(f"Wrote {output_path} ({output_path.stat().st_size / 1e9:.2f} GB)")
 
@@ -179,7 +696,8 @@ def main():
     parser = argparse.ArgumentParser(
         description="Convert single-channel TIFs to pyramidal OME-TIFF"
     )
-    parser.add_argument("input_dir", type=Path, help="Directory of channel TIF files")
+    parser.add_argument("input_dir", type=Path, nargs="?",
+                        help="Directory of channel TIF files")
     parser.add_argument("output_path", type=Path, help="Output OME-TIFF path")
     parser.add_argument(
         "--pixel-size",
@@ -187,14 +705,74 @@ def main():
         default=0.5077663810243286,
         help="Pixel size in \u00b5m (default: 0.5077663810243286)",
     )
+    parser.add_argument(
+        "--stream",
+        action="store_true",
+        help="Write tile by tile from memory-mapped inputs (bounded memory)",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="Tile-compression threads (default: tifffile's choice; 1 = serial)",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Keep channels finished by an interrupted run (per the manifest)",
+    )
+    parser.add_argument(
+        "--kernel",
+        choices=sorted(DOWNSAMPLE_KERNELS),
+        default="mean",
+        help="Pyramid downsampling kernel (default: mean)",
+    )
+    parser.add_argument(
+        "--channel-kernel",
+        action="append",
+        default=[],
+        metavar="NAME=KERNEL",
+        help="Per-channel kernel override, e.g. CD31=max (repeatable)",
+    )
+    parser.add_argument(
+        "--verify",
+        action="store_true",
+        help="Check every tile of output_path against its manifest and exit",
+    )
     args = parser.parse_args()
 
-    if not args.input_dir.is_dir():
+    if args.verify:
+        sys.exit(0 if verify(args.output_path, args.workers) else 1)
+
+    if args.output_path.suffix == ".zarr":
+        # convert_zarr always streams in row bands, single-threaded, from scratch
+        unsupported = [flag for flag, used in [("--stream", args.stream),
+                                               ("--workers", args.workers is not None),
+                                               ("--resume", args.resume)] if used]
+        if unsupported:
+            parser.error(f"{', '.join(unsupported)} not supported for .zarr output")
+
+    if args.input_dir is None or not args.input_dir.is_dir():
         sys.exit(f"Input directory not found: {args.input_dir}")
 
+    channel_kernels = {}
+    for item in args.channel_kernel:
+        name, _, kern = item.partition("=")
+        if kern not in DOWNSAMPLE_KERNELS:
+            sys.exit(f"Invalid --channel-kernel {item!r}; "
+                     f"expected NAME={{{','.join(sorted(DOWNSAMPLE_KERNELS))}}}")
+        channel_kernels[name] = kern
+
     args.output_path.parent.mkdir(parents=True, exist_ok=True)
 
-    convert(args.input_dir, args.output_path, args.pixel_size)
+    if args.output_path.suffix == ".zarr":
+        convert_zarr(args.input_dir, args.output_path, args.pixel_size,
+                     kernel=args.kernel, channel_kernels=channel_kernels)
+        return
+
+    convert(args.input_dir, args.output_path, args.pixel_size,
+            stream=args.stream, workers=args.workers, resume=args.resume,
+            kernel=args.kernel, channel_kernels=channel_kernels)
 
 
 if __name__ == "__main__":
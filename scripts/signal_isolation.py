@@ -0,0 +1,752 @@
+#!/usr/bin/env python3
+"""
+Config-driven signal isolation for registered Phenocycler spleen samples.
+
+Subtracts autofluorescence from every signal channel of each sample using
+the matched blank pair for its cycle position, then saves results to the
+sample's ImageJ/ output directory. Samples (donors) are described in a TOML
+manifest (default: signal_isolation_samples.toml next to this script), so
+onboarding a donor means adding a table there rather than copying a script.
+
+All channels of all selected samples share one process pool. Blank averages
+are cached on disk as .npy files keyed by the blank TIFs' size and mtime,
+reused across runs, and memory-mapped by the workers instead of being
+pickled into each task.
+
+Reruns are incremental: a per-sample build record stores, for every output
+channel, content hashes of its signal and blank TIFs, the values from its
+_param.txt and the kintsugi/numpy/tifffile versions. Only channels whose
+record no longer matches (or whose output was removed or replaced) are
+recomputed. Hashes are reused while a file's size and mtime are unchanged,
+so an up-to-date rerun reads no image data.
+
+Usage:
+    conda run -n KINTSUGI python scripts/signal_isolation.py [manifest.toml]
+        [--samples HDL73 HDL79] [--force] [--workers N] [--chunked]
+
+Flags:
+    --samples    Only process these manifest entries (default: all)
+    --force      Re-process all channels, even those that are up to date
+    --workers N  Number of channels processed in parallel across samples
+    --chunked    Memory-map the registered TIFs and subtract in row bands,
+                 for images larger than RAM
+"""
+
+import argparse
+import hashlib
+import importlib.metadata
+import json
+import resource
+import shutil
+import time
+import tomllib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from dataclasses import dataclass
+from pathlib import Path
+
+import numpy as np
+import tifffile
+
+from convert_to_ome_tiff import open_channel
+from uint16_stats import (
+    N_BINS,
+    hist_percentile,
+    subtraction_summary,
+    uint16_histogram,
+)
+from kintsugi.signal import (
+    analyze_for_subtraction,
+    compute_subtraction_quality,
+    subtract_autofluorescence,
+)
+
+PROJECT_ROOT = Path(__file__).resolve().parent.parent
+DEFAULT_MANIFEST = Path(__file__).resolve().parent / "signal_isolation_samples.toml"
+BLANK_POSITIONS = ("a", "b", "c")
+# Libraries whose version is part of every channel's build record
+BUILD_LIBRARIES = ("kintsugi", "numpy", "tifffile")
+
+# Chunked mode: rows subtracted per band and pixels in the QC/auto-analysis
+# subsample
+CHUNK_ROWS = 2048
+QC_MAX_PIXELS = 50_000_000
+
+
+@dataclass
+class SampleConfig:
+    """Paths and channel → blank-position layout for one registered sample."""
+
+    name: str
+    registered_dir: Path
+    output_dir: Path
+    params_dir: Path
+    channel_to_position: dict[str, str]
+
+    @property
+    def signal_channels(self) -> list[str]:
+        return sorted(self.channel_to_position)
+
+    @property
+    def blank_cache_dir(self) -> Path:
+        return self.output_dir.parent / "blank_cache"
+
+    @property
+    def build_record_path(self) -> Path:
+        return self.output_dir.parent / "signal_isolation_build.json"
+
+
+def channel_positions(
+    position_a: list[str],
+    position_b: list[str],
+    position_c: list[str],
+) -> dict[str, str]:
+    """Build a channel → blank-position map from per-position marker lists."""
+    mapping: dict[str, str] = {}
+    for pos, channels in zip(BLANK_POSITIONS, (position_a, position_b, position_c)):
+        for ch in channels:
+            mapping[ch] = pos
+    return mapping
+
+
+def load_manifest(path: Path) -> list[SampleConfig]:
+    """Read a TOML sample manifest into SampleConfigs.
+
+    Each ``[samples.<name>]`` table gives ``registered_dir``, ``output_dir``
+    and ``params_dir`` (relative to the project root) and may override the
+    top-level ``[positions]`` table of a/b/c marker lists.
+    """
+    with open(path, "rb") as fh:
+        manifest = tomllib.load(fh)
+
+    default_positions = manifest.get("positions", {})
+    configs = []
+    for name, sample in manifest["samples"].items():
+        positions = sample.get("positions", default_positions)
+        configs.append(SampleConfig(
+            name=name,
+            registered_dir=PROJECT_ROOT / sample["registered_dir"],
+            output_dir=PROJECT_ROOT / sample["output_dir"],
+            params_dir=PROJECT_ROOT / sample["params_dir"],
+            channel_to_position=channel_positions(
+                *(positions.get(pos, []) for pos in BLANK_POSITIONS)),
+        ))
+    return configs
+
+
+def load_image(path: Path) -> np.ndarray:
+    """Load a single-channel TIF as uint16."""
+    img = tifffile.imread(str(path))
+    return img.astype(np.uint16)
+
+
+def write_blank_average(registered_dir: Path, pos: str, out_path: Path) -> np.ndarray:
+    """Average the blank pair for a position into a uint16 .npy memmap.
+
+    Works in row bands from memory-mapped blanks, each band cast to uint16
+    first as load_image does. (a + b) >> 1 in uint32
+    equals the float32 mean truncated to uint16, without two full-size
+    float32 copies.
+    """
+    blank1 = open_channel(registered_dir / f"Blank1{pos}.tif")
+    blank13 = open_channel(registered_dir / f"Blank13{pos}.tif")
+    avg = np.lib.format.open_memmap(out_path, mode="w+", dtype=np.uint16,
+                                    shape=blank1.shape)
+    for y in range(0, avg.shape[0], CHUNK_ROWS):
+        a = np.asarray(blank1[y:y + CHUNK_ROWS]).astype(np.uint16, copy=False)
+        b = np.asarray(blank13[y:y + CHUNK_ROWS]).astype(np.uint16, copy=False)
+        acc = np.add(a, b, dtype=np.uint32)
+        acc >>= 1
+        avg[y:y + CHUNK_ROWS] = acc
+    avg.flush()
+    return avg
+
+
+def cached_blank_average(config: SampleConfig, pos: str) -> Path:
+    """Return a .npy of the blank average for ``pos``, computing it only if stale.
+
+    The cache key is the name, size and mtime of both blank TIFs, so
+    re-registered blanks are picked up automatically.
+    """
+    sources = [config.registered_dir / f"Blank{n}{pos}.tif" for n in (1, 13)]
+    stamp = [(p.name, p.stat().st_size, p.stat().st_mtime_ns) for p in sources]
+    key = hashlib.sha1(json.dumps(stamp).encode()).hexdigest()[:16]
+    path = config.blank_cache_dir / f"blank_{pos}_{key}.npy"
+    if path.exists():
+        print(f"  {config.name} position {pos}: cached ({path.name})")
+        return path
+
+    config.blank_cache_dir.mkdir(parents=True, exist_ok=True)
+    for stale in config.blank_cache_dir.glob(f"blank_{pos}_*.npy"):
+        stale.unlink()
+    tmp = path.with_suffix(".tmp.npy")
+    blank_avg = write_blank_average(config.registered_dir, pos, tmp)
+    median = hist_percentile(uint16_histogram(blank_avg), 50)
+    print(f"  {config.name} position {pos}: shape={blank_avg.shape}, "
+          f"median={int(median)}")
+    del blank_avg
+    tmp.replace(path)
+    return path
+
+
+def parse_param_file(params_dir: Path, marker: str) -> dict | None:
+    """Parse an existing parameter file and return subtraction params.
+
+    Returns dict with blank_clip_factor and blank_scale_factor, or None
+    if no param file exists.
+    """
+    param_path = params_dir / f"{marker}_param.txt"
+    if not param_path.exists():
+        return None
+
+    text = param_path.read_text()
+    params = {}
+
+    for line in text.splitlines():
+        if line.startswith("blank_clip_factor:"):
+            try:
+                params["blank_clip_factor"] = int(line.split(":", 1)[1].strip())
+            except ValueError:
+                pass
+        elif line.startswith("background_scale_factor:"):
+            try:
+                params["blank_scale_factor"] = float(line.split(":", 1)[1].strip())
+            except ValueError:
+                pass
+
+    if "blank_clip_factor" in params and "blank_scale_factor" in params:
+        return params
+    return None
+
+
+def find_signal_path(config: SampleConfig, marker: str) -> Path | None:
+    """Locate the registered TIF for ``marker``, or None if missing."""
+    signal_path = config.registered_dir / f"{marker}.tif"
+    if not signal_path.exists():
+        # Try HLA-DR variant naming
+        if marker == "HLADR":
+            signal_path = config.registered_dir / "HLADR.tif"
+            if not signal_path.exists():
+                signal_path = config.registered_dir / "HLA-DR.tif"
+        if not signal_path.exists():
+            return None
+    return signal_path
+
+
+def resolve_params(
+    config: SampleConfig,
+    marker: str,
+    signal: np.ndarray,
+    blank_avg: np.ndarray,
+    result_info: dict,
+    use_auto: bool = False,
+) -> dict:
+    """Subtraction params from the param file, else from auto-analysis.
+
+    Records the chosen values and their source in ``result_info``.
+    """
+    params = None if use_auto else parse_param_file(config.params_dir, marker)
+
+    if params is not None:
+        result_info["param_source"] = "file"
+    else:
+        # Auto-analyze
+        suggested = analyze_for_subtraction(
+            signal, blank_avg,
+            tissue_type="spleen",
+            marker_name=marker,
+        )
+        params = {
+            "blank_clip_factor": suggested["blank_clip_factor"],
+            "blank_scale_factor": suggested["blank_scale_factor"],
+        }
+        result_info["param_source"] = "auto"
+        result_info["confidence"] = suggested.get("confidence", None)
+    result_info["blank_clip_factor"] = params["blank_clip_factor"]
+    result_info["blank_scale_factor"] = params["blank_scale_factor"]
+    return params
+
+
+def record_histograms(result_info: dict, in_hist: np.ndarray, out_hist: np.ndarray) -> None:
+    """Fill percentile and histogram-SNR columns from input/output histograms."""
+    summary = subtraction_summary(in_hist, out_hist)
+    for prefix, key in (("input", "input"), ("output", "output")):
+        for q in ("p1", "p50", "p99"):
+            result_info[f"{prefix}_{q}"] = int(summary[key][q])
+        result_info[f"{prefix}_snr"] = summary[key]["snr"]
+    result_info["hist_signal_preservation"] = summary["signal_preservation"]
+    result_info["hist_background_removal"] = summary["background_removal"]
+
+
+def record_quality(result_info: dict, signal, subtracted, blank_avg) -> None:
+    """Run kintsugi's quality metrics and copy them into ``result_info``."""
+    quality = compute_subtraction_quality(signal, subtracted, blank_avg)
+    result_info["quality_score"] = quality.get("quality_score", None)
+    result_info["signal_preservation"] = quality.get("signal_preservation", None)
+    result_info["af_removal"] = quality.get("af_removal", None)
+    result_info["snr_improvement"] = quality.get("snr_improvement", None)
+
+
+def process_channel(
+    config: SampleConfig,
+    marker: str,
+    blank_avg: np.ndarray,
+    use_auto: bool = False,
+) -> dict:
+    """Process a single channel and return result info."""
+    signal_path = find_signal_path(config, marker)
+    if signal_path is None:
+        return {"marker": marker, "status": "MISSING", "error": "No file found"}
+
+    signal = load_image(signal_path)
+    result_info = {"marker": marker, "shape": signal.shape}
+
+    params = resolve_params(config, marker, signal, blank_avg, result_info, use_auto)
+
+    # Run subtraction
+    subtracted = subtract_autofluorescence(
+        signal, blank_avg,
+        blank_clip_factor=params["blank_clip_factor"],
+        blank_scale_factor=params["blank_scale_factor"],
+    )
+
+    record_quality(result_info, signal, subtracted, blank_avg)
+
+    # One histogram per image answers every percentile column
+    record_histograms(result_info, uint16_histogram(signal), uint16_histogram(subtracted))
+
+    # Save
+    output_path = config.output_dir / f"{marker}.tif"
+    tifffile.imwrite(str(output_path), subtracted)
+    result_info["status"] = "OK"
+
+    return result_info
+
+
+# ---------------------------------------------------------------------------
+# Chunked (bounded-memory) mode
+# ---------------------------------------------------------------------------
+def qc_sample(img: np.ndarray, max_pixels: int = QC_MAX_PIXELS) -> np.ndarray:
+    """Regular strided subsample of ``img`` with at most ~``max_pixels`` pixels."""
+    step = max(1, int(np.ceil(np.sqrt(img.size / max_pixels))))
+    return np.asarray(img[::step, ::step])
+
+
+def process_channel_chunked(
+    config: SampleConfig,
+    marker: str,
+    blank_avg: np.ndarray,
+    use_auto: bool = False,
+    chunk_rows: int = CHUNK_ROWS,
+) -> dict:
+    """Process a single channel in row bands with bounded memory.
+
+    The signal is memory-mapped and subtracted ``chunk_rows`` rows at a time
+    straight into a memory-mapped output TIF, so this assumes
+    subtract_autofluorescence is pixel-local (it takes the clip/scale
+    factors as explicit arguments). Percentiles come from one streaming
+    uint16 histogram per image; auto-analysis and quality metrics, which
+    need whole-image context, run on a strided subsample (QC_MAX_PIXELS).
+    """
+    signal_path = find_signal_path(config, marker)
+    if signal_path is None:
+        return {"marker": marker, "status": "MISSING", "error": "No file found"}
+
+    signal = open_channel(signal_path)
+    result_info = {"marker": marker, "shape": signal.shape, "qc_sampled": True}
+
+    signal_qc = qc_sample(signal)
+    blank_qc = qc_sample(blank_avg)
+    params = resolve_params(config, marker, signal_qc, blank_qc, result_info, use_auto)
+
+    # Subtract band by band into a memory-mapped output TIF; input and
+    # output histograms are accumulated in the same pass
+    output_path = config.output_dir / f"{marker}.tif"
+    out = tifffile.memmap(str(output_path), shape=signal.shape, dtype=np.uint16)
+    in_hist = np.zeros(N_BINS, dtype=np.int64)
+    out_hist = np.zeros(N_BINS, dtype=np.int64)
+    for y in range(0, signal.shape[0], chunk_rows):
+        band = np.asarray(signal[y:y + chunk_rows]).astype(np.uint16, copy=False)
+        sub = subtract_autofluorescence(
+            band, np.asarray(blank_avg[y:y + chunk_rows]),
+            blank_clip_factor=params["blank_clip_factor"],
+            blank_scale_factor=params["blank_scale_factor"],
+        ).astype(np.uint16, copy=False)
+        out[y:y + sub.shape[0]] = sub
+        in_hist += uint16_histogram(band)
+        out_hist += uint16_histogram(sub)
+        del band, sub
+    out.flush()
+
+    record_quality(result_info, signal_qc, qc_sample(out), blank_qc)
+    del out
+
+    record_histograms(result_info, in_hist, out_hist)
+    result_info["status"] = "OK"
+
+    return result_info
+
+
+def _run_channel(
+    config: SampleConfig,
+    marker: str,
+    blank_path: Path,
+    chunked: bool = False,
+) -> dict:
+    """Pool task: process one channel against a memory-mapped blank average.
+
+    Workers are single-use (max_tasks_per_child=1), so ru_maxrss is the peak
+    RSS of this channel alone.
+    """
+    start = time.perf_counter()
+    try:
+        # Copy-on-write map: pages are shared with the parent and other
+        # workers unless kintsugi writes into the blank.
+        blank_avg = np.load(blank_path, mmap_mode="c")
+        process = process_channel_chunked if chunked else process_channel
+        info = process(config, marker, blank_avg)
+    except Exception as e:
+        info = {"marker": marker, "status": "ERROR", "error": str(e)}
+    info["seconds"] = time.perf_counter() - start
+    info["peak_rss_gb"] = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1e6  # KiB on Linux
+    return info
+
+
+def print_summary(config: SampleConfig, results: list[dict]) -> None:
+    """Print the per-channel summary table and quality warnings."""
+    print("\n" + "=" * 136)
+    print(f"{'Marker':<14} {'Status':<8} {'Source':<6} {'Clip':>6} {'Scale':>6} "
+          f"{'Quality':>8} {'SigPres':>8} {'AF_Rem':>8} {'SNR_Imp':>8} "
+          f"{'In_p99':>8} {'Out_p50':>8} {'Out_p99':>8} {'HistSNR':>8} "
+          f"{'Time_s':>8} {'RSS_GB':>8}")
+    print("-" * 136)
+    for r in sorted(results, key=lambda x: x["marker"]):
+        timing = f"{r.get('seconds', float('nan')):>8.1f} {r.get('peak_rss_gb', float('nan')):>8.2f}"
+        if r["status"] == "OK":
+            qs = r.get("quality_score")
+            sp = r.get("signal_preservation")
+            af = r.get("af_removal")
+            snr = r.get("snr_improvement")
+            print(f"{r['marker']:<14} {r['status']:<8} {r.get('param_source',''):<6} "
+                  f"{r.get('blank_clip_factor',''):>6} {r.get('blank_scale_factor',''):>6.1f} "
+                  f"{qs:>8.3f} {sp:>8.3f} {af:>8.3f} {snr:>+8.2f} "
+                  f"{r.get('input_p99',''):>8} {r.get('output_p50',''):>8} "
+                  f"{r.get('output_p99',''):>8} {r.get('output_snr', float('nan')):>8.2f} {timing}")
+        else:
+            print(f"{r['marker']:<14} {r['status']:<8} {r.get('error','')}")
+    print("=" * 136)
+
+    # Final file count
+    final_count = len(list(config.output_dir.glob("*.tif")))
+    print(f"\nTotal files in ImageJ/: {final_count}")
+
+    # Check for any concerning quality scores
+    low_quality = [r for r in results
+                   if r["status"] == "OK"
+                   and r.get("quality_score") is not None
+                   and r["quality_score"] < 0.5]
+    if low_quality:
+        print("\nWARNING - Low quality scores (<0.5):")
+        for r in low_quality:
+            print(f"  {r['marker']}: quality={r['quality_score']:.3f}, "
+                  f"signal_preservation={r.get('signal_preservation', 'N/A')}")
+
+    low_signal = [r for r in results
+                  if r["status"] == "OK"
+                  and r.get("signal_preservation") is not None
+                  and r["signal_preservation"] < 0.3]
+    if low_signal:
+        print("\nWARNING - Low signal preservation (<0.3):")
+        for r in low_signal:
+            print(f"  {r['marker']}: signal_preservation={r['signal_preservation']:.3f}")
+
+
+# ---------------------------------------------------------------------------
+# Build record (incremental reruns)
+# ---------------------------------------------------------------------------
+def library_versions() -> dict[str, str]:
+    """Installed versions of BUILD_LIBRARIES ("unknown" if not installed)."""
+    versions = {}
+    for lib in BUILD_LIBRARIES:
+        try:
+            versions[lib] = importlib.metadata.version(lib)
+        except importlib.metadata.PackageNotFoundError:
+            versions[lib] = "unknown"
+    return versions
+
+
+def file_stamp(path: Path) -> dict:
+    st = path.stat()
+    return {"size": st.st_size, "mtime_ns": st.st_mtime_ns}
+
+
+def file_digest(path: Path, digests: dict) -> str:
+    """BLAKE2b of ``path``'s contents.
+
+    ``digests`` maps paths to their last stamp and digest; the file is only
+    re-read when its size or mtime changed.
+    """
+    stamp = file_stamp(path)
+    entry = digests.get(str(path))
+    if entry is not None and entry["stamp"] == stamp:
+        return entry["digest"]
+    with open(path, "rb") as fh:
+        digest = hashlib.file_digest(fh, "blake2b").hexdigest()
+    digests[str(path)] = {"stamp": stamp, "digest": digest}
+    return digest
+
+
+def load_build_record(config: SampleConfig) -> dict:
+    """The sample's build record, or an empty one."""
+    path = config.build_record_path
+    if path.exists():
+        return json.loads(path.read_text())
+    return {"digests": {}, "channels": {}}
+
+
+def save_build_record(config: SampleConfig, record: dict) -> None:
+    """Atomically write the sample's build record."""
+    path = config.build_record_path
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps(record, indent=1))
+    tmp.replace(path)
+
+
+def channel_inputs(
+    config: SampleConfig,
+    marker: str,
+    digests: dict,
+    chunked: bool = False,
+) -> dict | None:
+    """Everything the output of ``marker`` depends on, or None if its TIF is missing.
+
+    Param-file values are recorded as-is. Without a param file the
+    parameters are auto-derived from the hashed images, from the whole
+    image or (with ``chunked``) from a QC_MAX_PIXELS subsample, so the
+    processing mode is recorded instead.
+    """
+    signal_path = find_signal_path(config, marker)
+    if signal_path is None:
+        return None
+    pos = config.channel_to_position[marker]
+    sources = [signal_path] + [config.registered_dir / f"Blank{n}{pos}.tif" for n in (1, 13)]
+    params = parse_param_file(config.params_dir, marker)
+    if params is None:
+        params = {"auto": {"chunked": chunked,
+                           "qc_max_pixels": QC_MAX_PIXELS if chunked else None}}
+    return {
+        "inputs": {p.name: file_digest(p, digests) for p in sources},
+        "params": params,
+        "libraries": library_versions(),
+    }
+
+
+def stale_reason(
+    config: SampleConfig,
+    marker: str,
+    inputs: dict | None,
+    record: dict,
+) -> str | None:
+    """Why ``marker`` must be recomputed, or None if its output is up to date."""
+    if inputs is None:
+        return "missing input"
+    output_path = config.output_dir / f"{marker}.tif"
+    if not output_path.exists():
+        return "no output"
+    built = record["channels"].get(marker)
+    if built is None:
+        return "no build record"
+    for key in ("inputs", "params", "libraries"):
+        if built[key] != inputs[key]:
+            return f"{key} changed"
+    if built["output"] != file_stamp(output_path):
+        return "output modified"
+    return None
+
+
+def channels_to_process(
+    config: SampleConfig,
+    force: bool,
+    record: dict,
+    chunked: bool = False,
+) -> dict[str, dict | None]:
+    """Signal channels of ``config`` that need processing, with their inputs.
+
+    Hashes every channel's inputs into ``record["digests"]`` and compares
+    them against ``record["channels"]``; with ``force`` every channel is
+    returned. ``chunked`` is the processing mode (see channel_inputs).
+    """
+    config.output_dir.mkdir(parents=True, exist_ok=True)
+
+    to_process = {}
+    skipped = []
+    for marker in config.signal_channels:
+        inputs = channel_inputs(config, marker, record["digests"], chunked)
+        if inputs is None:
+            print(f"{config.name} {marker}: missing input, skipping")
+            continue
+        reason = "forced" if force else stale_reason(config, marker, inputs, record)
+        if reason is None:
+            skipped.append(marker)
+        else:
+            to_process[marker] = inputs
+            if not force:
+                print(f"{config.name} {marker}: {reason}")
+
+    if skipped:
+        print(f"{config.name}: skipping {len(skipped)} up-to-date channels: "
+              f"{', '.join(skipped)}")
+    print(f"{config.name}: processing {len(to_process)} channels")
+    return to_process
+
+
+def dapi_inputs(config: SampleConfig, digests: dict) -> dict | None:
+    """channel_inputs for the DAPI copy: its source digest only, None if missing."""
+    dapi_src = config.registered_dir / "DAPI.tif"
+    if not dapi_src.exists():
+        return None
+    return {"inputs": {dapi_src.name: file_digest(dapi_src, digests)},
+            "params": {}, "libraries": {}}
+
+
+def copy_dapi(config: SampleConfig, force: bool, record: dict) -> None:
+    """Copy DAPI through unchanged (no subtraction needed).
+
+    Recopied, like any channel, when its source digest or output stamp no
+    longer matches ``record["channels"]["DAPI"]``.
+    """
+    dapi_src = config.registered_dir / "DAPI.tif"
+    dapi_dst = config.output_dir / "DAPI.tif"
+    inputs = dapi_inputs(config, record["digests"])
+    if inputs is None:
+        print(f"{config.name} DAPI: WARNING - source file not found!")
+        return
+    reason = "forced" if force else stale_reason(config, "DAPI", inputs, record)
+    if reason is None:
+        print(f"{config.name} DAPI: up to date, skipping")
+        return
+    shutil.copy2(str(dapi_src), str(dapi_dst))
+    record["channels"]["DAPI"] = {**inputs, "output": file_stamp(dapi_dst)}
+    print(f"{config.name} DAPI: {reason}, copied (no subtraction needed)")
+
+
+def run_batch(
+    configs: list[SampleConfig],
+    force: bool = False,
+    workers: int = 1,
+    chunked: bool = False,
+) -> dict[str, list[dict]]:
+    """Process all signal channels of several samples in one shared pool.
+
+    With ``chunked``, each channel is processed in row bands with bounded
+    memory (see process_channel_chunked).
+
+    Returns per-sample lists of per-channel results.
+    """
+    tasks = []
+    records = {}
+    pending_inputs = {}
+    for config in configs:
+        records[config.name] = record = load_build_record(config)
+        for marker, inputs in channels_to_process(config, force, record, chunked).items():
+            tasks.append((config, marker))
+            pending_inputs[config.name, marker] = inputs
+        save_build_record(config, record)
+    print()
+
+    # Blank averages (one per sample and position), cached on disk
+    print("Computing blank averages...")
+    blank_paths = {}
+    for config, marker in tasks:
+        key = (config.name, config.channel_to_position[marker])
+        if key not in blank_paths:
+            blank_paths[key] = cached_blank_average(config, key[1])
+    print()
+
+    # Single-use workers release memory between channels and make
+    # per-channel peak RSS meaningful
+    results: dict[str, list[dict]] = {config.name: [] for config in configs}
+    print(f"Processing {len(tasks)} channels with {workers} worker(s)")
+    with ProcessPoolExecutor(max_workers=workers, max_tasks_per_child=1) as pool:
+        futures = {
+            pool.submit(_run_channel, config, marker,
+                        blank_paths[config.name, config.channel_to_position[marker]],
+                        chunked):
+            (config, marker)
+            for config, marker in tasks
+        }
+        for i, fut in enumerate(as_completed(futures), 1):
+            config, marker = futures[fut]
+            pos = config.channel_to_position[marker]
+            info = fut.result()
+            results[config.name].append(info)
+            record = records[config.name]
+            inputs = pending_inputs[config.name, marker]
+            if info["status"] == "OK" and inputs is not None:
+                output_path = config.output_dir / f"{marker}.tif"
+                record["channels"][marker] = {**inputs, "output": file_stamp(output_path)}
+            else:
+                record["channels"].pop(marker, None)
+            save_build_record(config, record)
+            print(f"[{i}/{len(tasks)}] {config.name} {marker} (blank position {pos})...",
+                  end=" ")
+            if info["status"] == "OK":
+                src = info["param_source"]
+                qs = info.get("quality_score")
+                qs_str = f"{qs:.3f}" if qs is not None else "N/A"
+                print(f"OK  [src={src}, clip={info['blank_clip_factor']}, "
+                      f"scale={info['blank_scale_factor']:.1f}, quality={qs_str}, "
+                      f"{info['seconds']:.0f}s, {info['peak_rss_gb']:.1f} GB]")
+            elif info["status"] == "ERROR":
+                print(f"ERROR: {info.get('error', 'unknown')}")
+            else:
+                print(f"SKIPPED: {info.get('error', 'unknown')}")
+
+    print()
+    for config in configs:
+        copy_dapi(config, force, records[config.name])
+        save_build_record(config, records[config.name])
+
+    for config in configs:
+        print(f"\n{config.name}")
+        print_summary(config, results[config.name])
+    return results
+
+
+def run_sample(
+    config: SampleConfig,
+    force: bool = False,
+    workers: int = 1,
+    chunked: bool = False,
+) -> list[dict]:
+    """Process all signal channels of one sample and return per-channel results."""
+    return run_batch([config], force=force, workers=workers, chunked=chunked)[config.name]
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Batch signal isolation from a sample manifest")
+    parser.add_argument("manifest", type=Path, nargs="?", default=DEFAULT_MANIFEST,
+                        help=f"TOML sample manifest (default: {DEFAULT_MANIFEST.name})")
+    parser.add_argument("--samples", nargs="+",
+                        help="Only process these samples (default: all in manifest)")
+    parser.add_argument("--force", action="store_true",
+                        help="Re-process all channels, even up-to-date ones")
+    parser.add_argument("--workers", type=int, default=1,
+                        help="Channels processed in parallel across samples (default: 1)")
+    parser.add_argument("--chunked", action="store_true",
+                        help="Memory-map inputs and subtract in row bands (bounded memory)")
+    args = parser.parse_args()
+
+    configs = load_manifest(args.manifest)
+    if args.samples:
+        known = {c.name for c in configs}
+        missing = set(args.samples) - known
+        if missing:
+            parser.error(f"samples not in manifest: {', '.join(sorted(missing))}")
+        configs = [c for c in configs if c.name in args.samples]
+
+    run_batch(configs, force=args.force, workers=args.workers, chunked=args.chunked)
+
+
+if __name__ == "__main__":
+    main()